@@ -1,162 +1,78 @@
-import pandas as pd
 from locust import HttpUser, task, between
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
 import urllib3
 import time
 import logging
-import random
 
 from configuration import configuration_system
+from arrival import arrival_wait, scheduled_start
+import monitor  # noqa: F401 - samples this load generator while the test runs
+import samples  # noqa: F401 - records every request when record_samples is on
+from credentials import AccountHolder
+from contexts import ContextUser
+from sessions import BrowserSession
+from handoff import CHAT_ID_PATTERN, REPLY_PREFIX, WATCH_INCOMING_JS, TAKE_INCOMING_JS, latency_since
 
 # Suppress SSL warnings if needed
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-class BeelinksUser(HttpUser):
-    wait_time = between(5, 10)
-
-    used_users = set()  # Static variable to store used users
-
-    @staticmethod
-    def load_users_from_excel(file_path):
-        try:
-            df = pd.read_excel(file_path)
-            users = df.to_dict('records')  # Convert each row to a dictionary
-            return users
-        except Exception as e:
-            logging.error(f"Error loading users from Excel: {e}")
-            return []
-
-    def get_unique_user(self):
-        # Load users from Excel and filter out used ones
-        users = self.load_users_from_excel(configuration_system.excel_file)
-        available_users = [user for user in users if user['email'] not in self.used_users]
-
-        if not available_users:
-            self.logger.error("No more unique users available.")
-            raise ValueError("All users have been used.")
-
-        # Select a random user from the available ones
-        selected_user = random.choice(available_users)
-        self.used_users.add(selected_user['email'])  # Mark the user as used
-        return selected_user
+class BeelinksUser(BrowserSession, HttpUser):
+    abstract = configuration_system.browser_contexts
+    uses_browser_pool = True
+    role = "agent"  # Used by load_shape.py to bring agents online before visitors
+    wait_time = arrival_wait(between(5, 10))
+    recording = "activechat"
 
     def on_start(self):
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-        # Select browser and headless option
-        browser = "chrome"  # Assuming you're using Chrome here, adjust as necessary
-        headless = True  # Replace with configuration system's headless selection logic
-
-        try:
-            if browser == "chrome":
-                options = ChromeOptions()
-                service = ChromeService(executable_path=configuration_system.driver_location)
-            else:
-                raise ValueError(f"Unsupported browser: {browser}")
-
-            options.add_argument("--disable-gpu")
-            options.add_argument("--window-size=1200,1200")
-            options.add_argument("--ignore-certificate-errors")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-web-security")
-            if headless:
-                options.add_argument("--headless")
-
-            # Initialize WebDriver using the standalone ChromeDriver
-            self.driver = webdriver.Chrome(service=service, options=options)
-            self.logger.info(f"{browser.capitalize()} browser started successfully.")
-
-        except (WebDriverException, ValueError) as e:
-            self.logger.error(f"Error setting up the browser: {e}")
-            raise
-
-        # Get a unique user for this session
-        self.user = self.get_unique_user()
-
-        try:
-            # Open the login page
-            self.driver.get(configuration_system.loadtestURL)
-            self.logger.info(f"Opened URL: {self.driver.current_url}")
-
-            # Wait for the body to load to ensure the page is fully loaded
-            WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            # Wait for the email input field and enter email
-            self.logger.info("Waiting for email field...")
-            email_field = WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.ID, "email"))
-            )
-            email_field.send_keys(self.user["email"])
-
-            # Wait for the password field and enter password
-            self.logger.info("Waiting for password field...")
-            password_field = WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.ID, "password"))
-            )
-            password_field.send_keys(self.user["password"])
-
-            # Wait for the login button and click it
-            self.logger.info("Waiting for login button...")
-            login_button = WebDriverWait(self.driver, 120).until(
-                EC.element_to_be_clickable((By.ID, "login-submit"))
-            )
-            login_button.click()
-
-        except TimeoutException as e:
-            self.logger.error(f"TimeoutException during login: {e}")
-            self.driver.quit()
-            raise
-        except Exception as e:
-            self.logger.error(f"An error occurred during login: {e}")
-            self.driver.quit()
-            raise
+        self.start_browser()
+        self.accepted_chats = set()
+        self.start_session()
 
     @task
     def accept_chat(self):
-        start_time = time.time()
+        start_time = scheduled_start(self)
         try:
             # Wait for the tickets link and click it
             self.logger.info("accepting chat...")
 
+            # Let the console settle once, then give each optional element a short look
+            # instead of three sequential 30s waits when they are absent
+            self.ready.settled()
+            self.watch_incoming_chats()
+
             # Try clicking the avatar (proceed if not found)
-            try:
-                WebDriverWait(self.driver, 30).until(
-                    EC.presence_of_element_located((By.XPATH,
-                                                    "//div[contains(@class, 'avatar') and contains(@class, 'ava-xs') and contains(@class, 'b-2')]"))
-                ).click()
+            avatar = self.ready.optional("avatar", EC.element_to_be_clickable((By.XPATH,
+                "//div[contains(@class, 'avatar') and contains(@class, 'ava-xs') and contains(@class, 'b-2')]")))
+            if avatar is not None:
+                avatar.click()
                 self.logger.info("Avatar found and clicked.")
-            except (TimeoutException, NoSuchElementException) as e:
-                self.logger.warning(f"Avatar not found: {e}. Proceeding without clicking it.")
+            else:
+                self.logger.warning("Avatar not found. Proceeding without clicking it.")
 
             # Try clicking the 'Not Accepting Chats' checkbox (proceed if not found)
-            try:
-                WebDriverWait(self.driver, 30).until(
-                    EC.presence_of_element_located(
-                        (By.XPATH, "//a[@title='Not Accepting Chats']//input[@type='checkbox']"))
-                ).click()
+            checkbox = self.ready.optional("accepting chats checkbox", EC.element_to_be_clickable(
+                (By.XPATH, "//a[@title='Not Accepting Chats']//input[@type='checkbox']")))
+            if checkbox is not None:
+                checkbox.click()
                 self.logger.info("Checkbox found and clicked.")
-            except (TimeoutException, NoSuchElementException) as e:
-                self.logger.warning(f"Checkbox not found: {e}. Proceeding without clicking it.")
+            else:
+                self.logger.warning("Checkbox not found. Proceeding without clicking it.")
 
                 # Try clicking the 'Tickets' checkbox (proceed if not found)
-                try:
-                    WebDriverWait(self.driver, 30).until(
-                        EC.presence_of_element_located(
-                            (By.XPATH, '//li[@id="nav-tickets"]/a'))
-                    ).click()
+                tickets = self.ready.optional("tickets link", EC.element_to_be_clickable(
+                    (By.XPATH, '//li[@id="nav-tickets"]/a')))
+                if tickets is not None:
+                    tickets.click()
                     self.logger.info("Ticket button found and clicked.")
-                except (TimeoutException, NoSuchElementException) as e:
-                    self.logger.warning(f"Ticket button not found: {e}. Proceeding without clicking it.")
+                else:
+                    self.logger.warning("Ticket button not found. Proceeding without clicking it.")
 
             # Measure response time
             # time.sleep(5)
@@ -165,7 +81,7 @@ class BeelinksUser(HttpUser):
 
             self.environment.events.request.fire(
                 request_type="UI Interaction",
-                name="Login and Navigate to Tickets",
+                name="Activate chat",
                 response_time=response_time,
                 response_length=0,
                 exception=None
@@ -176,7 +92,7 @@ class BeelinksUser(HttpUser):
             self.logger.error(f"TimeoutException occurred: {e}")
             self.environment.events.request.fire(
                 request_type="UI Interaction",
-                name="Login and Navigate to Tickets",
+                name="Activate chat",
                 response_time=None,
                 response_length=0,
                 exception=str(e)
@@ -185,8 +101,161 @@ class BeelinksUser(HttpUser):
             self.logger.error(f"An error occurred: {e}")
             self.environment.events.request.fire(
                 request_type="UI Interaction",
-                name="Login and Navigate to Tickets",
+                name="Activate chat",
                 response_time=None,
                 response_length=0,
                 exception=str(e)
             )
+
+        self.accept_handoffs()
+        self.resources.report(self.recorder.capture())
+
+    def watch_incoming_chats(self):
+        """Starts recording when stamped visitor chats show up in the console (once per page load)."""
+        try:
+            self.driver.execute_script(
+                f"return ({WATCH_INCOMING_JS})(arguments[0], arguments[1]);",
+                CHAT_ID_PATTERN.pattern, configuration_system.handoff_accept_xpath
+            )
+        except WebDriverException as e:
+            self.logger.warning(f"Could not watch for incoming chats: {e}")
+
+    def accept_handoffs(self):
+        """Accepts the stamped visitor chats seen so far and reports the visitor-to-agent handoff."""
+        try:
+            incoming = self.driver.execute_script(f"return ({TAKE_INCOMING_JS})();") or {}
+        except WebDriverException as e:
+            self.logger.warning(f"Could not read incoming chats: {e}")
+            return
+
+        for chat_id, sighting in incoming.items():
+            if chat_id in self.accepted_chats:
+                continue
+            self.accepted_chats.add(chat_id)
+            try:
+                # Select the chat before replying to it: the page claims every chat on sight, which leaves
+                # the last one claimed selected. The click also claims the chat if the page could not.
+                chats = self.driver.find_elements(
+                    By.XPATH, configuration_system.handoff_accept_xpath.format(chat_id=chat_id)
+                )
+                if not chats:
+                    self.logger.info(f"Chat {chat_id} is gone from the console; another agent took it.")
+                    continue
+                accepted_ms = sighting["accepted"] or time.time() * 1000
+                chats[0].click()
+
+                # Only the agent that won the claim reports the handoff, so each chat is counted once
+                claimed = self.ready.optional("chat claimed", EC.presence_of_element_located(
+                    (By.XPATH, configuration_system.handoff_claimed_xpath.format(chat_id=chat_id))))
+                if claimed is None:
+                    self.logger.info(f"Chat {chat_id} was accepted by another agent.")
+                    continue
+                self.fire_handoff("Handoff: chat received", latency_since(chat_id, sighting["seen"]))
+                self.fire_handoff("Handoff: chat accepted", latency_since(chat_id, accepted_ms))
+
+                # Reply so the visitor can time its wait for the first agent response
+                reply_input = self.ready.clickable(
+                    "agent reply input", By.ID, configuration_system.handoff_reply_input_id, 30
+                )
+                reply_input.send_keys(f"{REPLY_PREFIX}{chat_id}")
+                reply_input.send_keys(Keys.RETURN)
+            except StaleElementReferenceException:
+                self.logger.info(f"Chat {chat_id} left the console while being selected; another agent took it.")
+            except WebDriverException as e:
+                self.logger.error(f"Could not accept chat {chat_id}: {e}")
+                self.fire_handoff("Handoff: chat accepted", None, str(e))
+
+    def fire_handoff(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="Handoff",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
+
+class BeelinksContextUser(AccountHolder, ContextUser):
+    """Agent running in an isolated context of the worker's shared browser."""
+
+    abstract = not configuration_system.browser_contexts
+    role = "agent"
+    wait_time = arrival_wait(between(5, 10))
+
+    def on_start(self):
+        super().on_start()
+        self.user = self.get_unique_user()
+        self.accepted_chats = set()
+        self.browser.run(self.login(self.user))
+
+    def on_stop(self):
+        super().on_stop()
+        self.release_user()
+
+    async def activate_chat(self):
+        await self.page.evaluate(f"([pattern, xpath]) => ({WATCH_INCOMING_JS})(pattern, xpath)",
+                                 [CHAT_ID_PATTERN.pattern, configuration_system.handoff_accept_xpath])
+        # Same fallbacks as the WebDriver flow: each element is optional and gets a short look
+        timeout = configuration_system.optional_element_timeout * 1000
+        await self.click_if_present(
+            "//div[contains(@class, 'avatar') and contains(@class, 'ava-xs') and contains(@class, 'b-2')]", timeout)
+        if not await self.click_if_present("//a[@title='Not Accepting Chats']//input[@type='checkbox']", timeout):
+            await self.click_if_present('//li[@id="nav-tickets"]/a', timeout)
+
+    async def accept_handoffs(self):
+        """Accepts the stamped visitor chats seen so far; returns the handoff results to report."""
+        page = self.page
+        results = []
+        timeout = configuration_system.optional_element_timeout * 1000
+        incoming = await page.evaluate(f"() => ({TAKE_INCOMING_JS})()")
+        for chat_id, sighting in incoming.items():
+            if chat_id in self.accepted_chats:
+                continue
+            self.accepted_chats.add(chat_id)
+            try:
+                # Select the chat before replying to it, as in the WebDriver flow
+                chats = page.locator(configuration_system.handoff_accept_xpath.format(chat_id=chat_id))
+                if not await chats.count():
+                    self.logger.info(f"Chat {chat_id} is gone from the console; another agent took it.")
+                    continue
+                accepted_ms = sighting["accepted"] or time.time() * 1000
+                await chats.first.click(timeout=timeout)
+
+                # Only the agent that won the claim reports the handoff, so each chat is counted once
+                claimed = page.locator(configuration_system.handoff_claimed_xpath.format(chat_id=chat_id))
+                try:
+                    await claimed.first.wait_for(state="attached", timeout=timeout)
+                except Exception:
+                    self.logger.info(f"Chat {chat_id} was accepted by another agent.")
+                    continue
+                results.append(("Handoff: chat received", latency_since(chat_id, sighting["seen"]), None))
+                results.append(("Handoff: chat accepted", latency_since(chat_id, accepted_ms), None))
+
+                # Reply so the visitor can time its wait for the first agent response
+                reply_input = page.locator(f"#{configuration_system.handoff_reply_input_id}")
+                await reply_input.fill(f"{REPLY_PREFIX}{chat_id}", timeout=30000)
+                await reply_input.press("Enter")
+            except Exception as e:
+                self.logger.error(f"Could not accept chat {chat_id}: {e}")
+                results.append(("Handoff: chat accepted", None, str(e)))
+        return results
+
+    def fire_handoff(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="Handoff",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
+    @task
+    def accept_chat(self):
+        self.logger.info("accepting chat...")
+        self.run_step("Activate chat", self.activate_chat())
+        self.resources.report()
+        try:
+            for name, response_time, exception in self.browser.run(self.accept_handoffs()):
+                self.fire_handoff(name, response_time, exception)
+        except Exception as e:
+            self.logger.warning(f"Could not read incoming chats: {e}")
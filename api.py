@@ -0,0 +1,17 @@
+"""HTTP-only visitors and agents, kept out of chat.py and ticket.py so those run only browsers.
+
+    locust -f api.py BeelinksApiUser
+    locust -f api.py BeelinksChatApiUser --host http://127.0.0.1:8766
+
+The classes are abstract where they are defined; these subclasses make them runnable.
+"""
+import chat
+import ticket
+
+
+class BeelinksChatApiUser(chat.BeelinksChatApiUser):
+    pass
+
+
+class BeelinksApiUser(ticket.BeelinksApiUser):
+    pass
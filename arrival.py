@@ -0,0 +1,92 @@
+import time
+
+from locust import events
+
+from configuration import configuration_system
+
+
+class ArrivalSchedule:
+    """
+    Fixed-rate start slots shared by all users of one class on this worker.
+
+    Slots are handed out at configuration_system.arrival_rate per second no matter how long
+    earlier iterations took, so a slow server does not slow the load down. When every user is
+    busy the slots pile up and the lag shows how far the generator is behind schedule.
+    """
+
+    _schedules = {}
+
+    def __init__(self, environment, name, rate):
+        self.environment = environment
+        self.name = name
+        self.interval = 1.0 / rate
+        self.next_slot = time.time()
+
+    @classmethod
+    def shared(cls, user):
+        """Returns the schedule of the user's class, creating it on first use."""
+        name = type(user).__name__
+        if name not in cls._schedules:
+            cls._schedules[name] = cls(user.environment, name, configuration_system.arrival_rate)
+        return cls._schedules[name]
+
+    @classmethod
+    def reset(cls):
+        cls._schedules.clear()
+
+    def claim(self):
+        """Takes the next slot; returns its intended start time."""
+        intended = self.next_slot
+        self.next_slot += self.interval
+        return intended
+
+    def wait(self, user):
+        """Seconds the user sleeps until its slot; records the slot and reports lag behind it above the threshold."""
+        intended = self.claim()
+        user.intended_start = intended
+        now = time.time()
+        if now <= intended:
+            return intended - now
+        lag = (now - intended) * 1000
+        # Only real lag is reported, so on-time iterations do not add a request each to the stats
+        if lag >= configuration_system.arrival_lag_threshold_ms:
+            # response_length carries the number of later slots that are already due as well
+            backlog = int((now - self.next_slot) / self.interval) + 1 if now >= self.next_slot else 0
+            self.fire(lag, backlog)
+        return 0
+
+    def fire(self, lag, backlog):
+        self.environment.events.request.fire(
+            request_type="Schedule",
+            name=f"Schedule lag ({self.name})",
+            response_time=lag,
+            response_length=backlog,
+            exception=None
+        )
+
+
+def arrival_wait(think_time):
+    """wait_time that follows the arrival schedule when arrival_rate is set, else the given think time."""
+    def wait_time(user):
+        if not configuration_system.arrival_rate:
+            return think_time(user)
+        return ArrivalSchedule.shared(user).wait(user)
+    return wait_time
+
+
+def scheduled_start(user):
+    """
+    Returns when the user's current iteration was supposed to start, and forgets it.
+
+    Latency measured from here includes the time the iteration spent queued behind a busy
+    generator (coordinated-omission correction). Outside an arrival schedule it is now.
+    """
+    intended = getattr(user, "intended_start", None)
+    user.intended_start = None
+    return min(intended, time.time()) if intended is not None else time.time()
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    # A new run starts its schedule from the current time again
+    ArrivalSchedule.reset()
@@ -0,0 +1,260 @@
+"""Measures what our own scripts cost, per user class, against the bundled mock server.
+
+    python benchmark.py --users 10 --duration 60 --output after.json --compare before.json
+
+Each user class runs in its own process against mock_server.py and reports VUs per core, memory
+per VU, spawn-to-ready time (on_start) and WebDriver commands per iteration. Save the results of
+one harness version with --output and pass them to --compare on the next run to see the change.
+"""
+import argparse
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+USER_CLASSES = [
+    "chat.BeelinksUser",
+    "chat.BeelinksChatApiUser",
+    "ticket.BeelinksUser",
+    "ticket.BeelinksApiUser",
+    "activechat.BeelinksUser",
+]
+
+METRICS = [
+    ("vus_per_core", "VUs/core"),
+    ("memory_per_vu_mb", "MB/VU"),
+    ("spawn_to_ready_ms", "ready ms"),
+    ("commands_per_iteration", "cmds/iter"),
+    ("iterations_per_second", "iter/s"),
+    ("failures", "failures"),
+]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock server did not come up on port {port}")
+
+
+def write_credentials(path, count):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    workbook.active.append(["email", "password"])
+    for number in range(count):
+        workbook.active.append([f"benchmark-{number}@mock.test", "benchmark"])
+    workbook.save(path)
+
+
+def run_one(args):
+    """Runs a single user class in this process and prints its results as JSON."""
+    from configuration import configuration_system
+
+    configuration_system.loadtestURL = f"http://127.0.0.1:{args.port}"
+    configuration_system.chatWindowURL = f"http://127.0.0.1:{args.chat_port}/"
+    configuration_system.chat_api_url = f"http://127.0.0.1:{args.chat_port}"
+    configuration_system.excel_file = args.excel
+    configuration_system.session_cache = False
+    configuration_system.arrival_rate = 0
+    configuration_system.monitor_interval = 0
+    configuration_system.chat_ack_selector = "#transcript > div"  # The mock adds entries once the server echoes them
+
+    import gevent
+    import psutil
+    from locust import events
+    from locust.env import Environment
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+    # Count every WebDriver command (CDP calls and scripts included) on the driver that sent it
+    execute = WebDriver.execute
+
+    def counted_execute(self, driver_command, params=None):
+        self.command_count = getattr(self, "command_count", 0) + 1
+        return execute(self, driver_command, params)
+
+    WebDriver.execute = counted_execute
+
+    module_name, class_name = args.run.rsplit(".", 1)
+    user_class = getattr(importlib.import_module(module_name), class_name)
+
+    def commands(user):
+        return getattr(getattr(user, "driver", None), "command_count", None)
+
+    def fire(environment, name, value):
+        environment.events.request.fire(
+            request_type="Benchmark", name=name, response_time=value, response_length=0, exception=None
+        )
+
+    class Benchmarked(user_class):
+        abstract = False
+
+        def on_start(self):
+            start_time = time.time()
+            super().on_start()
+            fire(self.environment, "spawn to ready", (time.time() - start_time) * 1000)
+            self.commands_seen = commands(self)
+
+        def wait_time(self):
+            # Called once after every iteration
+            count = commands(self)
+            if count is not None and self.commands_seen is not None:
+                fire(self.environment, "commands per iteration", count - self.commands_seen)
+            self.commands_seen = count
+            fire(self.environment, "iteration", 0)
+            return args.think_time
+
+    Benchmarked.__name__ = user_class.__name__
+
+    visitor = getattr(user_class, "role", "visitor") == "visitor"
+    environment = Environment(user_classes=[Benchmarked], events=events,
+                              host=configuration_system.chat_api_url if visitor else configuration_system.loadtestURL)
+    runner = environment.create_local_runner()
+    events.init.fire(environment=environment, runner=runner, web_ui=None)
+
+    process = psutil.Process()
+
+    def tree():
+        processes = [process]
+        try:
+            processes.extend(process.children(recursive=True))
+        except psutil.Error:
+            pass
+        return processes
+
+    def rss(processes):
+        total = 0
+        for item in processes:
+            try:
+                total += item.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    baseline_mb = rss(tree())
+    runner.start(args.users, args.spawn_rate)
+
+    # Ready once every user finished on_start, however long the browsers took
+    # (starting the runner clears the stats, so entries are looked up afresh)
+    deadline = time.time() + args.ready_timeout
+    while environment.stats.get("spawn to ready", "Benchmark").num_requests < args.users and time.time() < deadline:
+        gevent.sleep(0.5)
+
+    processes = tree()
+    for item in processes:
+        try:
+            item.cpu_percent(None)
+        except psutil.Error:
+            pass
+    iterations_before = environment.stats.get("iteration", "Benchmark").num_requests
+    gevent.sleep(args.duration)
+    cpu_percent = 0.0
+    for item in processes:
+        try:
+            cpu_percent += item.cpu_percent(None)
+        except psutil.Error:
+            pass
+    steady_mb = rss(tree())
+    iterations = environment.stats.get("iteration", "Benchmark").num_requests - iterations_before
+
+    commands_entry = environment.stats.get("commands per iteration", "Benchmark")
+    failures = sum(entry.num_failures for (_, method), entry in environment.stats.entries.items()
+                   if method != "Benchmark")
+    ready = environment.stats.get("spawn to ready", "Benchmark")
+    users = ready.num_requests
+    result = {
+        "user_class": args.run,
+        "users": users,
+        "vus_per_core": round(users / (cpu_percent / 100), 1) if cpu_percent and users else None,
+        "memory_per_vu_mb": round((steady_mb - baseline_mb) / users, 1) if users else None,
+        "spawn_to_ready_ms": round(ready.median_response_time) if users else None,
+        "commands_per_iteration": round(commands_entry.avg_response_time, 1) if commands_entry.num_requests else None,
+        "iterations_per_second": round(iterations / args.duration, 2),
+        "failures": failures,
+    }
+
+    runner.quit()
+    events.quitting.fire(environment=environment, reverse=True)
+    print(json.dumps(result))
+
+
+def print_table(results, baseline):
+    previous = {result["user_class"]: result for result in baseline}
+    print(f"{'user class':<28}" + "".join(f"{label:>18}" for _, label in METRICS))
+    for result in results:
+        row = f"{result['user_class']:<28}"
+        before = previous.get(result["user_class"], {})
+        for key, _ in METRICS:
+            value = result.get(key)
+            cell = "-" if value is None else f"{value}"
+            if before.get(key) not in (None, 0) and value is not None:
+                cell += f" ({(value - before[key]) / before[key]:+.0%})"
+            row += f"{cell:>18}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harness overhead benchmark against the mock Beelinks server.")
+    parser.add_argument("--user-class", action="append", dest="user_classes",
+                        help=f"module.Class to benchmark, repeatable (default: {', '.join(USER_CLASSES)})")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--spawn-rate", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds measured once every user is ready")
+    parser.add_argument("--think-time", type=float, default=1, help="Seconds between iterations")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server latency per response")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chat-port", type=int, default=8766)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--excel", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args)
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen([sys.executable, os.path.join(here, "mock_server.py"), "--port", str(args.port),
+                               "--chat-port", str(args.chat_port), "--latency", str(args.latency)])
+    results = []
+    try:
+        wait_for_port(args.port)
+        wait_for_port(args.chat_port)
+        with tempfile.TemporaryDirectory() as directory:
+            excel = os.path.join(directory, "benchmark_users.xlsx")
+            write_credentials(excel, args.users * 2)
+            for user_class in args.user_classes or USER_CLASSES:
+                command = [sys.executable, os.path.abspath(__file__), "--run", user_class, "--excel", excel]
+                for option in ("users", "spawn_rate", "duration", "think_time", "ready_timeout", "port", "chat_port"):
+                    command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+                completed = subprocess.run(command, cwd=here, stdout=subprocess.PIPE, text=True)
+                lines = completed.stdout.strip().splitlines()
+                if completed.returncode or not lines:
+                    print(f"{user_class} failed (exit code {completed.returncode})", file=sys.stderr)
+                    continue
+                results.append(json.loads(lines[-1]))
+    finally:
+        server.terminate()
+
+    baseline = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import logging
+import time
+from collections import deque
+
+import gevent
+from locust import events
+from locust.runners import MasterRunner
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.common.exceptions import WebDriverException
+
+from configuration import configuration_system
+from resources import policies_in_use
+
+
+def performance_log_enabled():
+    return policies_in_use() or configuration_system.record_traffic
+
+
+def create_driver():
+    """Launches a headless Chrome with the options shared by all Beelinks users."""
+    options = ChromeOptions()
+    service = ChromeService(executable_path=configuration_system.driver_location)
+
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1200,1200")
+    options.add_argument("--ignore-certificate-errors")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-web-security")
+    if configuration_system.headless:
+        options.add_argument("--headless")
+    if performance_log_enabled():
+        # Network events for the per-user blocked/loaded report in resources.py and for recording.py
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    return webdriver.Chrome(service=service, options=options)
+
+
+class BrowserPool:
+    """Per-worker pool of pre-launched browsers that users lease on start and return on stop."""
+
+    _shared = None
+
+    def __init__(self, environment, target_size):
+        self.environment = environment
+        self.target_size = target_size
+        self.idle = deque()
+        self.launching = 0
+        self.filler = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls, environment):
+        """Returns this process's pool, creating it on first use."""
+        if cls._shared is None:
+            cls._shared = cls(environment, configuration_system.browser_pool_size)
+        return cls._shared
+
+    def fire(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="Browser Pool",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
+    def launch(self):
+        """Starts a new browser and reports how long Chrome took to come up."""
+        start_time = time.time()
+        try:
+            driver = create_driver()
+        except WebDriverException as e:
+            self.fire("Launch", None, str(e))
+            raise
+        self.fire("Launch", (time.time() - start_time) * 1000)
+        return driver
+
+    def start(self):
+        """Fills the pool up to its target size in the background."""
+        if self.filler is None or self.filler.dead:
+            self.filler = gevent.spawn(self.fill)
+
+    def fill(self):
+        while len(self.idle) + self.launching < self.target_size:
+            self.launching += 1
+            try:
+                self.idle.append(self.launch())
+            except WebDriverException as e:
+                logging.error(f"Error pre-launching a browser: {e}")
+                return
+            finally:
+                self.launching -= 1
+
+    def lease(self):
+        """Hands out a warm browser if one is idle, otherwise launches one on the spot."""
+        start_time = time.time()
+        if self.idle:
+            driver = self.idle.popleft()
+            self.hits += 1
+            self.fire("Lease (hit)", (time.time() - start_time) * 1000)
+        else:
+            driver = self.launch()
+            self.misses += 1
+            self.fire("Lease (miss)", (time.time() - start_time) * 1000)
+        # Top the pool back up for the next users being spawned
+        if self.target_size:
+            self.start()
+        return driver
+
+    def release(self, driver):
+        """Resets the browser's cookies and storage and puts it back in the pool."""
+        try:
+            self.reset(driver)
+        except WebDriverException as e:
+            logging.warning(f"Discarding browser that failed to reset: {e}")
+            self.discard(driver)
+            return
+        if len(self.idle) < self.target_size:
+            self.idle.append(driver)
+        else:
+            self.discard(driver)
+
+    @staticmethod
+    def reset(driver):
+        """Clears everything a previous user left behind so the next lease starts clean."""
+        driver.switch_to.default_content()
+        driver.get("about:blank")
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in (configuration_system.loadtestURL, configuration_system.chatWindowURL):
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin.rstrip("/"), "storageTypes": "all"})
+        if policies_in_use():
+            # Lift the previous user's resource policy
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+        if performance_log_enabled():
+            # Drop the previous user's unreported network events
+            driver.get_log("performance")
+
+    @staticmethod
+    def discard(driver):
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            logging.warning(f"Error closing the browser: {e}")
+
+    def close(self):
+        """Quits every idle browser."""
+        if self.filler is not None:
+            self.filler.kill()
+        while self.idle:
+            self.discard(self.idle.popleft())
+        if self.hits or self.misses:
+            logging.info(f"Browser pool: {self.hits} hits, {self.misses} misses.")
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    # Warm the pool before users start spawning (no-op on the master, which runs no users)
+    if not configuration_system.browser_pool_size or isinstance(environment.runner, MasterRunner):
+        return
+    # Only when a selected user class actually leases from the pool
+    if any(getattr(user_class, "uses_browser_pool", False) for user_class in environment.user_classes):
+        BrowserPool.shared(environment).start()
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    if BrowserPool._shared is not None:
+        BrowserPool._shared.close()
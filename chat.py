@@ -1,143 +1,164 @@
-import pandas as pd
 from locust import HttpUser, task, between
-from selenium import webdriver
 from selenium.webdriver import Keys
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, WebDriverException
 import urllib3
 import time
 import logging
+import json
+import ssl
+from urllib.parse import urljoin
+
+import gevent
+import websocket
+from gevent.event import AsyncResult
 from configuration import configuration_system
+from arrival import arrival_wait, scheduled_start
+import monitor  # noqa: F401 - samples this load generator while the test runs
+import samples  # noqa: F401 - records every request when record_samples is on
+from contexts import ContextUser
+from sessions import BrowserSession
+from transcript import WATCH_MESSAGE_JS, WAIT_MESSAGE_JS, ack_selector, new_message_tag
+from handoff import REPLY_PREFIX, WATCH_REPLY_JS, REPLY_SEEN_JS, new_chat_id, latency_since
 
 # Suppress SSL warnings if needed
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-class BeelinksUser(HttpUser):
-    wait_time = between(5, 10)
+class BeelinksUser(BrowserSession, HttpUser):
+    abstract = configuration_system.browser_contexts
+    uses_browser_pool = True
+    role = "visitor"  # Used by load_shape.py to bring agents online before visitors
+    wait_time = arrival_wait(between(5, 10))
+    recording = "chat"
+    sends_chat_messages = True  # Needs chat_ack_selector, checked by transcript.py before the test
 
     def on_start(self):
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-        # Initialize browser settings
-        self.driver = self.initialize_browser()
+        self.start_browser()
+        self.recorder.start_page("start")
 
         # Open the login page and perform initial actions
         self.initial_actions()
 
-    def initialize_browser(self):
-        """Initializes the Selenium WebDriver."""
-        browser = "chrome"
-        headless = True  # Replace with configuration system's headless selection logic
-
-        try:
-            if browser == "chrome":
-                options = ChromeOptions()
-                service = ChromeService(executable_path=configuration_system.driver_location)
-
-                options.add_argument("--disable-gpu")
-                options.add_argument("--window-size=1200,1200")
-                options.add_argument("--ignore-certificate-errors")
-                options.add_argument("--disable-extensions")
-                options.add_argument("--disable-web-security")
-                if headless:
-                    options.add_argument("--headless")
-
-                driver = webdriver.Chrome(service=service, options=options)
-                self.logger.info(f"{browser.capitalize()} browser started successfully.")
-                return driver
-            else:
-                raise ValueError(f"Unsupported browser: {browser}")
-
-        except (WebDriverException, ValueError) as e:
-            self.logger.error(f"Error setting up the browser: {e}")
-            raise
-
     def initial_actions(self):
         """Opens the login page and performs necessary actions."""
         try:
-            self.driver.get("https://testwindow.beelinks.solutions/")
+            self.driver.get(configuration_system.chatWindowURL)
             self.logger.info(f"Opened URL: {self.driver.current_url}")
 
-            # Wait for the body to load to ensure the page is fully loaded
-            WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
+            # Wait for the document to finish loading
+            self.ready.page_loaded(120)
+            self.timing.collect("Chat window page")
 
             self.start_form_fill_and_chat_interaction()
 
         except TimeoutException as e:
             self.logger.error(f"TimeoutException during initial actions: {e}")
-            self.cleanup()
+            self.release_browser()
             raise
 
     def start_form_fill_and_chat_interaction(self):
         """Handles form filling and chat interaction."""
         self.logger.info("Starting form fill and chat test...")
-        time.sleep(30)  # Consider replacing with WebDriverWait if possible
-        self.driver.switch_to.frame(0)
-        self.wait_for_element(By.ID, "title", 40).click()
-        time.sleep(5)
-        self.driver.switch_to.default_content()
-        time.sleep(2)
-        self.driver.switch_to.frame(1)
-        self.wait_for_element(By.ID, "btnChat", 30).click()
-        time.sleep(2)
+        # The widget script injects its iframes once it has loaded
+        self.ready.frame("chat launcher iframe", 0, 40)
+        self.ready.clickable("chat launcher", By.ID, "title", 40).click()
+        self.ready.frame("chat window iframe", 1, 30)
+        self.ready.clickable("chat button", By.ID, "btnChat", 30)
+        self.timing.collect("Chat widget iframe")
+        self.driver.find_element(By.ID, "btnChat").click()
+        self.ready.present("pre-chat form", By.ID, "field3", 30)
 
         # Fill chat form
         self.fill_chat_form()
 
-    def wait_for_element(self, by, value, timeout):
-        """Waits for an element to be present."""
-        return WebDriverWait(self.driver, timeout).until(
-            EC.presence_of_element_located((by, value))
-        )
-
     def fill_chat_form(self):
         """Fills in the chat form fields."""
         try:
-            self.driver.find_element(By.ID, "field3").send_keys("test")
-            self.driver.find_element(By.ID, "field4").send_keys("test@test.com")
-            self.driver.find_element(By.ID, "field5").send_keys("12212122121212")
-            time.sleep(2)  # Consider reducing sleep or replacing with appropriate waits
-            self.driver.find_element(By.ID, "btnStartChat").click()
-            time.sleep(5)
-            self.driver.find_element(By.ID, "chatMessage")  # Just ensure this is loaded
+            self.ready.clickable("start chat button", By.ID, "btnStartChat", 30)
+            # Stamp the chat so agent users can time the handoff, even on other workers; the stamp
+            # is taken right before the form is filled and submitted in one round-trip
+            self.chat_id = new_chat_id()
+            self.reply_reported = False
+            self.recorder.parameter("chat_id", self.chat_id)
+            self.interactions.fill_and_submit("pre-chat form", [
+                ("field3", self.chat_id),
+                ("field4", f"{self.chat_id}@test.com"),
+                ("field5", "12212122121212"),
+            ], "btnStartChat")
+            self.ready.clickable("chat input", By.ID, "chatMessage", 30)
+            self.driver.execute_script(f"return ({WATCH_REPLY_JS})(arguments[0]);", REPLY_PREFIX + self.chat_id)
 
         except TimeoutException as e:
             self.logger.error(f"TimeoutException during form fill: {e}")
-            self.cleanup()
+            self.release_browser()
             raise
 
-    def cleanup(self):
-        """Cleans up the WebDriver instance."""
-        if hasattr(self, 'driver'):
-            self.driver.quit()
-
     @task
     def chattest(self):
-        """Tests the chat functionality."""
-        start_time = time.time()  # Start the timer here for accurate response time measurement
+        """Sends a tagged message and times it until it shows up in the transcript."""
+        tag = new_message_tag()
+        timeout = configuration_system.chat_echo_timeout
+        queued = (time.time() - scheduled_start(self)) * 1000
+        self.recorder.start_page("iteration")
 
         try:
             chat_input = self.driver.find_element(By.ID, "chatMessage")
-            chat_input.send_keys("test message")
+            self.driver.execute_script(
+                f"return ({WATCH_MESSAGE_JS})(arguments[0], arguments[1]);",
+                tag, ack_selector()
+            )
+            chat_input.send_keys(f"test message {tag}")
             chat_input.send_keys(Keys.RETURN)
 
-            # Measure response time
-            response_time = (time.time() - start_time) * 1000
-            self.log_request("Chat initiated successfully.", response_time)
+            # Round-trip measured inside the page, from the Enter keydown to the transcript update
+            self.driver.set_script_timeout(timeout + 5)
+            response_time = self.driver.execute_script(
+                f"return ({WAIT_MESSAGE_JS})(arguments[0], arguments[1]);", tag, timeout * 1000
+            )
+            if response_time is None:
+                self.log_request(f"Message {tag} not delivered.", None, f"Message not in transcript after {timeout}s")
+            else:
+                self.log_request("Chat initiated successfully.", response_time + queued)
 
         except TimeoutException as e:
             self.log_request("TimeoutException occurred during chat initiation.", None, str(e))
         except Exception as e:
             self.log_request("An error occurred during chat initiation.", None, str(e))
 
+        self.check_agent_reply()
+        self.resources.report(self.recorder.capture())
+
+    def check_agent_reply(self):
+        """Reports the visitor's wait for the first agent response, once per chat."""
+        if self.reply_reported:
+            return
+        try:
+            seen = self.driver.execute_script(f"return ({REPLY_SEEN_JS})(arguments[0]);", REPLY_PREFIX + self.chat_id)
+        except WebDriverException as e:
+            self.logger.error(f"Could not read the agent reply state: {e}")
+            return
+        if seen is not None:
+            self.fire_handoff("Handoff: first agent response", latency_since(self.chat_id, seen))
+        elif latency_since(self.chat_id, time.time() * 1000) > configuration_system.handoff_timeout * 1000:
+            self.fire_handoff("Handoff: first agent response", None,
+                              f"No agent reply after {configuration_system.handoff_timeout}s")
+        else:
+            return
+        self.reply_reported = True
+
+    def fire_handoff(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="Handoff",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
     def log_request(self, message, response_time, exception=None):
         """Logs the request and fires Locust events."""
         if response_time is not None:
@@ -158,3 +179,204 @@ class BeelinksUser(HttpUser):
                 exception=exception
             )
             self.logger.error(message)
+
+
+class BeelinksContextUser(ContextUser):
+    """Chat visitor running in an isolated context of the worker's shared browser."""
+
+    abstract = not configuration_system.browser_contexts
+    role = "visitor"
+    wait_time = arrival_wait(between(5, 10))
+    sends_chat_messages = True
+
+    def on_start(self):
+        super().on_start()
+        self.browser.run(self.open_chat())
+
+    def chat_frame(self):
+        return self.page.frame_locator("iframe").nth(1)
+
+    async def open_chat(self):
+        """Opens the widget and fills in the pre-chat form."""
+        page = self.page
+        await page.goto(configuration_system.chatWindowURL, timeout=120000)
+        await page.frame_locator("iframe").nth(0).locator("#title").click(timeout=40000)
+
+        chat = self.chat_frame()
+        await chat.locator("#btnChat").click(timeout=30000)
+        await chat.locator("#btnStartChat").wait_for(timeout=30000)
+        # Stamp the chat so agent users can time the handoff, even on other workers; the form is
+        # there by now, so the fills and the click follow the stamp without waiting
+        self.chat_id = new_chat_id()
+        self.reply_reported = False
+        await chat.locator("#field3").fill(self.chat_id)
+        await chat.locator("#field4").fill(f"{self.chat_id}@test.com")
+        await chat.locator("#field5").fill("12212122121212")
+        await chat.locator("#btnStartChat").click()
+        await chat.locator("#chatMessage").evaluate(
+            f"(input, tag) => ({WATCH_REPLY_JS})(tag)", REPLY_PREFIX + self.chat_id, timeout=30000
+        )
+
+    async def send_message(self, tag, timeout):
+        """Sends a tagged message and returns its in-page round-trip in ms, or None on timeout."""
+        chat_input = self.chat_frame().locator("#chatMessage")
+        await chat_input.evaluate(
+            f"(input, [tag, ackSelector]) => ({WATCH_MESSAGE_JS})(tag, ackSelector)",
+            [tag, ack_selector()]
+        )
+        await chat_input.fill(f"test message {tag}")
+        await chat_input.press("Enter")
+        return await chat_input.evaluate(
+            f"(input, [tag, timeoutMs]) => ({WAIT_MESSAGE_JS})(tag, timeoutMs)", [tag, timeout * 1000]
+        )
+
+    @task
+    def chattest(self):
+        """Sends a tagged message and times it until it shows up in the transcript."""
+        tag = new_message_tag()
+        timeout = configuration_system.chat_echo_timeout
+        queued = (time.time() - scheduled_start(self)) * 1000
+        try:
+            response_time = self.browser.run(self.send_message(tag, timeout))
+        except Exception as e:
+            self.logger.error(f"An error occurred during chat initiation: {e}")
+            self.fire("Chat initiated", None, str(e))
+            return
+        if response_time is None:
+            self.fire("Chat initiated", None, f"Message not in transcript after {timeout}s")
+        else:
+            self.fire("Chat initiated", response_time + queued)
+
+        self.check_agent_reply()
+        self.resources.report()
+
+    def check_agent_reply(self):
+        """Reports the visitor's wait for the first agent response, once per chat."""
+        if self.reply_reported:
+            return
+        try:
+            seen = self.browser.run(self.chat_frame().locator("#chatMessage").evaluate(
+                f"(input, tag) => ({REPLY_SEEN_JS})(tag)", REPLY_PREFIX + self.chat_id
+            ))
+        except Exception as e:
+            self.logger.error(f"Could not read the agent reply state: {e}")
+            return
+        if seen is not None:
+            self.fire("Handoff: first agent response", latency_since(self.chat_id, seen))
+        elif latency_since(self.chat_id, time.time() * 1000) > configuration_system.handoff_timeout * 1000:
+            self.fire("Handoff: first agent response", None,
+                      f"No agent reply after {configuration_system.handoff_timeout}s")
+        else:
+            return
+        self.reply_reported = True
+
+
+class BeelinksChatApiUser(HttpUser):
+    """Chat visitor that talks to the widget's backend directly instead of driving a browser."""
+
+    abstract = True  # Opt in through api.py, so chat.py runs only browser visitors
+    host = configuration_system.chat_api_url
+    role = "visitor"
+    wait_time = arrival_wait(between(5, 10))
+
+    def on_start(self):
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.socket = None
+        self.receiver = None
+        self.pending = {}  # (frame type, message id) -> AsyncResult set with the arrival time
+
+        # Submit the pre-chat form, stamped like the browser visitors so agents can time the handoff
+        self.chat_id = new_chat_id()
+        form = {
+            "field3": self.chat_id,
+            "field4": f"{self.chat_id}@test.com",
+            "field5": "12212122121212",
+        }
+        with self.client.post(configuration_system.chat_start_path, data=form,
+                              name="API Chat start", catch_response=True) as response:
+            try:
+                session = response.json()
+                socket_path = session["socket"]
+            except (ValueError, KeyError, TypeError):
+                response.failure(f"Chat start did not return a session: {response.error or response.status_code}")
+                raise ValueError("Could not create a chat session")
+
+        self.connect(urljoin(response.url, socket_path))
+
+    def connect(self, url):
+        """Opens the realtime channel for the chat session and starts reading from it."""
+        url = "ws" + url[len("http"):] if url.startswith("http") else url
+        cookie = "; ".join(f"{cookie.name}={cookie.value}" for cookie in self.client.cookies)
+        start_time = time.time()
+        try:
+            self.socket = websocket.create_connection(
+                url, timeout=configuration_system.chat_echo_timeout, cookie=cookie or None,
+                sslopt={"cert_reqs": ssl.CERT_NONE}
+            )
+        except (websocket.WebSocketException, OSError) as e:
+            self.fire("API Chat connect", None, str(e))
+            raise
+        self.socket.settimeout(None)
+        self.fire("API Chat connect", (time.time() - start_time) * 1000)
+        self.receiver = gevent.spawn(self.receive_loop)
+
+    def receive_loop(self):
+        """Wakes up the task waiting for each ack and transcript frame as it arrives."""
+        while True:
+            try:
+                frame = self.socket.recv()
+            except (websocket.WebSocketException, OSError):
+                return
+            arrived = time.time()
+            try:
+                message = json.loads(frame)
+            except (TypeError, ValueError):
+                continue
+            waiter = self.pending.pop((message.get("type"), message.get("id")), None)
+            if waiter is not None:
+                waiter.set(arrived)
+
+    def on_stop(self):
+        if self.receiver is not None:
+            self.receiver.kill()
+        if self.socket is not None:
+            self.socket.close()
+
+    @task
+    def chattest(self):
+        """Sends a tagged message and reports send, ack and receive latency."""
+        tag = new_message_tag()
+        ack = self.pending[("ack", tag)] = AsyncResult()
+        echo = self.pending[("message", tag)] = AsyncResult()
+
+        intended_start = scheduled_start(self)
+        start_time = time.time()
+        try:
+            self.socket.send(json.dumps({"type": "message", "id": tag, "text": f"test message {tag}"}))
+        except (websocket.WebSocketException, OSError) as e:
+            self.fire("API Chat send", None, str(e))
+            self.pending.clear()
+            return
+        self.fire("API Chat send", (time.time() - intended_start) * 1000)
+
+        deadline = start_time + configuration_system.chat_echo_timeout
+        for name, waiter in (("API Chat ack", ack), ("API Chat receive", echo)):
+            try:
+                arrived = waiter.get(timeout=max(deadline - time.time(), 0))
+                self.fire(name, (arrived - intended_start) * 1000)
+            except gevent.Timeout:
+                self.fire(name, None, f"No frame after {configuration_system.chat_echo_timeout}s")
+        self.pending.pop(("ack", tag), None)
+        self.pending.pop(("message", tag), None)
+
+    def fire(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="WebSocket",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
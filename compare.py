@@ -0,0 +1,181 @@
+"""Compares a new run against a stored baseline and fails the build on regressions.
+
+    python compare.py baseline/ current/ --output verdict.json
+
+A run is a directory holding Locust's stats CSV (locust --csv <dir>/run ...) and, when the run
+recorded raw samples with samples_dir pointing into it, histograms.json. Every request name in
+both runs is compared on p50/p95/p99, throughput and error rate against the tolerances in
+configuration_system.regression_tolerances. With histograms, a latency regression also has to
+be statistically significant (one-sided Kolmogorov-Smirnov test); error rates always use a
+two-proportion z-test. Exit code 0 means pass, 1 a regression, 2 that a run could not be read.
+
+Names of the baseline that the new run lacks are only warnings, since several names change from
+run to run by design (resource names, waits, per-path names). They fail the check with
+--fail-on-missing, or when they match one of the regression_required_names patterns.
+"""
+import argparse
+import csv
+import fnmatch
+import glob
+import json
+import math
+import os
+import sys
+
+from configuration import configuration_system
+from samples import LatencyHistogram
+
+PERCENTILES = (("p50", "50%", 0.5), ("p95", "95%", 0.95), ("p99", "99%", 0.99))
+
+
+class Run:
+    """Per-name stats of one stored run."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = path if os.path.isdir(path) else os.path.dirname(path)
+        stats_files = [path] if path.endswith(".csv") else sorted(glob.glob(os.path.join(path, "*_stats.csv")))
+        if not stats_files:
+            raise ValueError(f"No Locust *_stats.csv in {path}")
+        self.stats = {}
+        with open(stats_files[0], newline="") as f:
+            for row in csv.DictReader(f):
+                if row["Name"] == "Aggregated" or row["Type"] in configuration_system.regression_ignore_types:
+                    continue
+                self.stats[row["Name"]] = row
+
+        self.histograms = {}
+        histograms_path = os.path.join(directory, "histograms.json")
+        if os.path.exists(histograms_path):
+            with open(histograms_path) as f:
+                self.histograms = {name: LatencyHistogram(counts) for name, counts in json.load(f).items()}
+
+    def percentile(self, name, column, percent):
+        if name in self.histograms and self.histograms[name].total():
+            return self.histograms[name].percentile(percent)
+        return number(self.stats[name][column])
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ks_slower_p_value(baseline, current):
+    """One-sided two-sample Kolmogorov-Smirnov p-value for 'current is slower than baseline'."""
+    n1, n2 = baseline.total(), current.total()
+    if not n1 or not n2:
+        return None
+    seen1 = seen2 = 0
+    d_plus = 0.0
+    for key in sorted(set(baseline.counts) | set(current.counts)):
+        seen1 += baseline.counts.get(key, 0)
+        seen2 += current.counts.get(key, 0)
+        d_plus = max(d_plus, seen1 / n1 - seen2 / n2)
+    return min(math.exp(-2 * (n1 * n2 / (n1 + n2)) * d_plus ** 2), 1.0)
+
+
+def error_rate_p_value(failures1, n1, failures2, n2):
+    """One-sided two-proportion z-test p-value for 'the current error rate is higher'."""
+    pooled = (failures1 + failures2) / (n1 + n2)
+    if pooled in (0, 1):
+        return 1.0
+    z = (failures2 / n2 - failures1 / n1) / math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def required(name):
+    """True when a request name must be present in every run (regression_required_names)."""
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in configuration_system.regression_required_names)
+
+
+def compare(baseline, current):
+    """Returns one comparison dict per request name and metric."""
+    tolerances = configuration_system.regression_tolerances
+    alpha = configuration_system.regression_alpha
+    comparisons = []
+
+    for name in sorted(set(baseline.stats) & set(current.stats)):
+        base, new = baseline.stats[name], current.stats[name]
+        n1, n2 = int(base["Request Count"]), int(new["Request Count"])
+        if min(n1, n2) < configuration_system.regression_min_requests:
+            comparisons.append({"name": name, "metric": "requests", "baseline": n1, "current": n2,
+                                "status": "insufficient data"})
+            continue
+
+        def add(metric, before, after, change, tolerance, p_value=None):
+            regressed = change is not None and change > tolerance and (p_value is None or p_value < alpha)
+            comparisons.append({
+                "name": name, "metric": metric, "baseline": before, "current": after,
+                "change": None if change is None else round(change, 4), "tolerance": tolerance,
+                "p_value": None if p_value is None else round(p_value, 6),
+                "status": "regression" if regressed else "ok",
+            })
+
+        # Latency: relative increase, confirmed by the distribution test when histograms exist
+        p_value = None
+        if name in baseline.histograms and name in current.histograms:
+            p_value = ks_slower_p_value(baseline.histograms[name], current.histograms[name])
+        for metric, column, percent in PERCENTILES:
+            before, after = baseline.percentile(name, column, percent), current.percentile(name, column, percent)
+            change = (after - before) / before if before and after is not None else None
+            add(metric, before, after, change, tolerances[metric], p_value)
+
+        # Throughput: relative drop
+        before, after = number(base["Requests/s"]), number(new["Requests/s"])
+        add("throughput", before, after, (before - after) / before if before else None, tolerances["throughput"])
+
+        # Error rate: absolute increase in the failed share, confirmed by the z-test
+        failures1, failures2 = int(base["Failure Count"]), int(new["Failure Count"])
+        add("error_rate", round(failures1 / n1, 4), round(failures2 / n2, 4), failures2 / n2 - failures1 / n1,
+            tolerances["error_rate"], error_rate_p_value(failures1, n1, failures2, n2))
+
+    for name in sorted(set(baseline.stats) - set(current.stats)):
+        comparisons.append({"name": name, "metric": "requests", "baseline": int(baseline.stats[name]["Request Count"]),
+                            "current": 0, "status": "missing", "required": required(name)})
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run-to-run performance regression check.")
+    parser.add_argument("baseline", help="Directory (or *_stats.csv) of the baseline run")
+    parser.add_argument("current", help="Directory (or *_stats.csv) of the run to check")
+    parser.add_argument("--output", help="Write the verdict JSON here as well as to stdout")
+    parser.add_argument("--fail-on-missing", action="store_true",
+                        help="Fail on every baseline name missing from the current run, not only the required ones")
+    args = parser.parse_args()
+
+    try:
+        baseline, current = Run(args.baseline), Run(args.current)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({"verdict": "error", "error": str(e)}))
+        return 2
+
+    comparisons = compare(baseline, current)
+    failed = [item for item in comparisons if item["status"] == "regression"
+              or (item["status"] == "missing" and (item["required"] or args.fail_on_missing))]
+    warnings = [item for item in comparisons if item["status"] == "missing" and item not in failed]
+    verdict = {
+        "verdict": "fail" if failed else "pass",
+        "baseline": args.baseline,
+        "current": args.current,
+        "regressions": failed,
+        "warnings": warnings,
+        "comparisons": comparisons,
+    }
+    text = json.dumps(verdict, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    for item in failed:
+        print(f"REGRESSION {item['name']} {item['metric']}: {item['baseline']} -> {item['current']}", file=sys.stderr)
+    for item in warnings:
+        print(f"WARNING {item['name']} missing from the current run ({item['baseline']} requests before)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,140 @@ class configuration_system:
 
     loadtestURL = "https://testapp.beelinks.solutions"
 
+    # Page hosting the chat widget that chat.py visitors open
+    chatWindowURL = "https://testwindow.beelinks.solutions/"
+
+    # Chat widget transport used by the protocol-level visitor (BeelinksChatApiUser in chat.py)
+    chat_api_url = "https://testwindow.beelinks.solutions"
+    chat_start_path = "/chat/start"  # Pre-chat form submit; answers with the session and its socket path
+
+    # Paths used by the HTTP-only agent in ticket.py (BeelinksApiUser)
+    login_path = "/login"  # Fallback when the login form has no action attribute
+    tickets_path = "/tickets"  # Fallback when the nav-tickets link is not found after login
+    tickets_api_paths = []  # XHR endpoints the tickets view calls on load, e.g. ["/tickets/list"]
+
     # If chromedriver.exe is in the root directory, correct the path:
     driver_location = './chromedriver.exe'  # Use './' for the current directory
 
+    # Run Chrome without a window
+    headless = True
+
+    # Browsers kept pre-launched per worker; users lease one on start and return it on stop (0 disables)
+    browser_pool_size = 5
+
+    # Host many users per browser process, each in its own isolated context (requires playwright)
+    browser_contexts = False
+    context_step_timeout = 300  # Seconds before a step in the shared browser is abandoned as failed
+
     # If users.xlsx is in the root directory, correct the path:
-    excel_file = './users21to40.xlsx'  # Use './' for the current directory
+    # A glob pattern merges every matching file into one credential store
+    excel_file = './users*.xlsx'  # Use './' for the current directory
+
+    # Distributed runs: each worker owns a stripe of the credential store, handed out in slices by the master
+    credential_slice_size = 50  # Accounts per slice
+    credential_slice_timeout = 10  # Seconds to wait for the master before taking the whole stripe
+
+    # Readiness waits: how often conditions are polled and how long optional elements get
+    readiness_poll_interval = 0.1  # Seconds between condition checks
+    optional_element_timeout = 3  # Seconds to look for elements that may legitimately be absent
+    network_idle_quiet_period = 0.5  # Seconds without new resource loads before a page counts as idle
+    resource_log_size = 1000  # Latest resource timings kept per page, for page timing and scenario [server] shares
+
+    # Chat round-trip: a sent message counts once it shows up in the visitor's transcript
+    chat_echo_timeout = 30  # Seconds before an undelivered message is reported as a failure
+    # CSS selector of transcript entries the server confirmed (agent/bot container or delivered marks), never
+    # the optimistic local echo; required by the browser visitors, e.g. "#transcript .message.delivered"
+    chat_ack_selector = None
+
+    # Visitor-to-agent handoff: agents accept stamped visitor chats and reply to them
+    handoff_timeout = 120  # Seconds a visitor waits for the first agent response before it counts as failed
+    handoff_accept_xpath = "//*[contains(text(), '{chat_id}')]"  # Element an agent clicks to accept a chat
+    # Element that shows a chat is now this agent's; other agents who tried to claim it skip the chat
+    handoff_claimed_xpath = "//*[contains(@class, 'claimed') and contains(text(), '{chat_id}')]"
+    handoff_reply_input_id = "chatMessage"  # Agent console message box used for the first reply
+
+    # Browser timing: how many of a page's slowest resources are reported, under "<page>: slowest resource"
+    timing_slowest_resources = 3
+
+    # Session cache: reuse each agent's cookies and localStorage instead of logging in through the UI every time
+    session_cache = False
+    session_cache_dir = './.session_cache'  # One file per email, shared by workers on the same machine
+    session_cache_ttl = 1800  # Seconds a stored session is trusted before it is discarded
+    logged_in_xpath = '//li[@id="nav-tickets"]'  # Element that only exists once an agent is logged in
+
+    # Saturation shape (load_shape.py): step users up until a p95 or error rate SLO breaks
+    shape_start_users = 10
+    shape_step_users = 10  # Users added per step
+    shape_max_users = 500
+    shape_spawn_rate = 2  # Users started per second within a step
+    shape_agent_ratio = 0.2  # Share of each step's users that are agents; they come online before the visitors
+    shape_window = 30  # Seconds per rolling stats window
+    shape_min_hold = 60  # Seconds a step is held at least, even once latency is stable
+    shape_max_hold = 300  # Seconds after which a step counts as stable anyway
+    shape_stable_tolerance = 0.1  # p95 change between consecutive windows that still counts as stable
+    shape_slo_p95 = {"Chat initiated": 5000, "Login and Navigate to Tickets": 15000}  # Request name: p95 limit in ms
+    shape_max_error_rate = 0.01
+    # Pseudo-request types the shape leaves out of its error rate and p95 (samples, schedules, derived timings)
+    shape_ignore_types = ["Schedule", "Browser Pool", "Session Cache", "Benchmark", "Page Timing", "Wait"]
+    shape_on_breach = "stop"  # "stop", or "backoff" to hold the last good step for shape_max_hold before stopping
+    shape_report_file = './shape_report.json'
+
+    # Open-model scheduling: iterations start at a fixed rate instead of after each user's think time
+    arrival_rate = 0  # Iterations per second per user class on each worker; 0 keeps the between(5, 10) think time
+    arrival_lag_threshold_ms = 100  # Iterations starting later than this behind their slot are reported as schedule lag
+
+    # Run outputs that are not request stats, e.g. the load generator samples below
+    results_dir = './results'
+
+    # Load generator self-monitoring: CPU, memory and open files of each worker and its browsers
+    monitor_interval = 0  # Seconds between samples; 0 (the default) disables the monitor
+    monitor_file = 'generator_{worker}.csv'  # Samples are appended here, in results_dir, one file per worker process
+    monitor_max_cpu_percent = 85  # Machine-wide CPU above which the generator counts as out of headroom
+    monitor_min_available_mb = 1024  # Free memory below which the generator counts as out of headroom
+    monitor_max_open_files = 0  # Worker file descriptors/handles limit; 0 = not checked
+    monitor_breach_samples = 3  # Consecutive samples out of headroom before spawning is stopped
+
+    # Resource policies: keep browsers from loading what does not exercise the app servers
+    resource_policies = {
+        "lean": {
+            "block_types": ["image", "font", "media"],  # image, font, media, stylesheet
+            "block_urls": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                           "*facebook.net*", "*hotjar.com*"],
+            "allow_urls": [],  # Never blocked, even when they match block_types (shared-browser mode only)
+        },
+    }
+    resource_policy = None  # Policy every scenario uses; None loads everything
+    scenario_resource_policies = {}  # Per-scenario override keyed by locustfile, e.g. {"chat": "lean", "activechat": None}
+    resource_full_fidelity_share = 0.05  # Share of users that load everything anyway, as a baseline to compare against
+
+    # Raw samples: every request streamed to one file per worker, plus histograms merged on the master
+    record_samples = False
+    samples_dir = './samples'
+    samples_block_rows = 5000  # Rows buffered per block before it is appended to the file
+    samples_flush_interval = 10  # Seconds after which a partial block is written anyway
+    histogram_significant_digits = 3  # Histogram precision; 3 keeps latencies from 0.1 ms up within 0.5% (4: 0.05%)
+
+    # Regression check (compare.py): how much worse a run may be than its baseline
+    regression_tolerances = {
+        "p50": 0.10,  # Relative latency increase
+        "p95": 0.15,
+        "p99": 0.25,
+        "throughput": 0.10,  # Relative drop in requests per second
+        "error_rate": 0.01,  # Absolute increase in the failed share of requests
+    }
+    regression_alpha = 0.01  # Significance level a latency or error rate change must also reach
+    regression_min_requests = 20  # Request names with fewer requests in either run are not judged
+    regression_ignore_types = ["Generator", "Resources", "Schedule", "Browser Pool", "Session Cache"]
+    regression_required_names = []  # Name patterns (e.g. "Login page", "Replay *") that fail the check when missing
+
+    # Hybrid mode: a few browser users record their traffic (recording.py), many HTTP users replay it (replay.py)
+    record_traffic = False  # WebDriver users write recordings and report every app request as "Browser <name>"
+    recordings_dir = './recordings'  # One HAR-like file per browser user
+    record_iterations = 3  # Task iterations kept per recording; later ones are still reported, not stored
+    replay_resource_types = ["Document", "XHR", "Fetch"]  # Recorded request types that become replay steps
+    replay_script = './replay.json'  # Written by python replay.py recordings/*.har
+    hybrid_browser_users = 2  # Browser users per scenario in hybrid.py; every other user replays
+
+    # Scenario engine (scenarios.py): browser flows as ordered steps in a JSON file, one user class each in flows.py
+    scenario_file = './scenarios.json'
+    scenario_server_timing = True  # Split each step into [server] and [own] time, at one extra script call per step
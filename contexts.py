@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+
+import gevent
+from gevent.event import AsyncResult
+from locust import User, events
+
+from configuration import configuration_system
+from arrival import scheduled_start
+from resources import FULL, ResourcePolicy, policies_in_use
+
+class SharedBrowser:
+    """One browser process per worker, driven asynchronously, hosting an isolated context per user."""
+
+    _shared = None
+
+    def __init__(self):
+        # Locust has already patched selectors, sockets and subprocess, so the loop turns as a greenlet
+        # on the worker's hub where those primitives work, instead of on a thread with no hub of its own
+        self.loop = asyncio.new_event_loop()
+        self.turning = gevent.spawn(self.loop.run_forever)
+        self.playwright = None
+        self.browser = None
+        self.ready = AsyncResult()
+
+    @classmethod
+    def shared(cls):
+        """Returns this process's browser, launching it on first use."""
+        if cls._shared is not None and cls._shared.turning.dead:
+            logging.warning("The shared browser's event loop stopped; launching a new browser.")
+            cls._shared = None
+        if cls._shared is None:
+            # Publish the instance first so users spawned during launch wait instead of launching again
+            shared = cls._shared = cls()
+            try:
+                shared.browser = shared.run(shared.launch())
+                shared.ready.set(shared)
+            except Exception as e:
+                shared.ready.set_exception(e)
+        return cls._shared.ready.get()
+
+    def run(self, coro, timeout=None):
+        """Runs a coroutine on the browser's event loop and waits for it without blocking other users."""
+        timeout = configuration_system.context_step_timeout if timeout is None else timeout
+        result = AsyncResult()
+
+        def done(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set(future.result())
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(done)
+        try:
+            return result.get(timeout=timeout)
+        except gevent.Timeout:
+            future.cancel()
+            raise TimeoutError(f"Browser step did not finish within {timeout} seconds")
+
+    async def launch(self):
+        # Imported here so the WebDriver users keep working without playwright installed
+        from playwright.async_api import async_playwright
+
+        self.playwright = await async_playwright().start()
+        browser = await self.playwright.chromium.launch(
+            headless=configuration_system.headless,
+            args=["--disable-gpu", "--disable-extensions", "--disable-web-security"],
+        )
+        logging.info("Shared Chromium browser started successfully.")
+        return browser
+
+    def new_context(self):
+        """Creates a fresh incognito-like context with its own cookies, storage and cache."""
+        return self.run(self.browser.new_context(
+            ignore_https_errors=True,
+            viewport={"width": 1200, "height": 1200},
+        ))
+
+    async def shutdown(self):
+        await self.browser.close()
+        await self.playwright.stop()
+
+    def close(self):
+        try:
+            if self.browser is not None:
+                self.run(self.shutdown(), timeout=30)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.turning.join(timeout=30)
+
+
+class ContextUser(User):
+    """Base class for users that live in an isolated context of the worker's shared browser."""
+
+    abstract = True
+
+    def on_start(self):
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.browser = SharedBrowser.shared()
+        self.context = self.browser.new_context()
+        self.resources = ResourcePolicy.for_user(self)
+        if policies_in_use():
+            self.browser.run(self.watch_resources())
+        self.page = self.browser.run(self.context.new_page())
+
+    def on_stop(self):
+        if getattr(self, "context", None) is not None:
+            self.browser.run(self.context.close())
+            self.context = None
+
+    def fire(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="UI Interaction",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
+    def run_step(self, name, coro):
+        """Runs an async step in this user's page and reports its duration under the given name."""
+        queued = (time.time() - scheduled_start(self)) * 1000
+        try:
+            self.fire(name, self.browser.run(self.timed(coro)) + queued)
+            return True
+        except Exception as e:
+            self.logger.error(f"An error occurred during {name}: {e}")
+            self.fire(name, None, str(e))
+            return False
+
+    async def watch_resources(self):
+        if self.resources.name != FULL:
+            await self.context.route("**/*", self.resources.route)
+        self.context.on("requestfinished", self.resources.finished)
+
+    @staticmethod
+    async def timed(coro):
+        # Timed on the event loop so the thread hop back to the greenlet is not counted
+        start_time = time.time()
+        await coro
+        return (time.time() - start_time) * 1000
+
+    async def click_if_present(self, selector, timeout):
+        """Clicks an optional element, returning False instead of failing when it never shows up."""
+        try:
+            await self.page.locator(selector).first.click(timeout=timeout)
+            return True
+        except Exception as e:
+            self.logger.warning(f"{selector} not found: {e}. Proceeding without clicking it.")
+            return False
+
+    async def login(self, user):
+        """Logs an agent in through the Beelinks login form."""
+        page = self.page
+        await page.goto(configuration_system.loadtestURL, timeout=120000)
+        await page.locator("#email").fill(user["email"], timeout=120000)
+        await page.locator("#password").fill(user["password"], timeout=120000)
+        await page.locator("#login-submit").click(timeout=120000)
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    if SharedBrowser._shared is not None:
+        SharedBrowser._shared.close()
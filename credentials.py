@@ -0,0 +1,246 @@
+import glob
+import logging
+import random
+from collections import deque
+
+from gevent.event import Event
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+from openpyxl import load_workbook
+
+from configuration import configuration_system
+
+# Custom messages used by the master to hand out disjoint credential slices
+CREDENTIALS_REQUEST = "credentials_request"
+CREDENTIALS_SLICE = "credentials_slice"
+CREDENTIALS_STRIPE = "credentials_stripe"
+
+
+class CredentialPool:
+    """Process-wide pool of agent credentials, parsed once and checked out in O(1)."""
+
+    _pools = {}  # One pool per Excel file (or glob pattern) per process
+
+    def __init__(self, credentials):
+        # Compact storage: one (email, password) tuple per account, in a stable order
+        self.credentials = credentials
+        self.index_by_email = {email: index for index, (email, _) in enumerate(credentials)}
+        self.available = deque(random.sample(range(len(credentials)), len(credentials)))
+        self.checked_out = set()
+
+        # Distributed mode: the worker only owns its stripe of the store, handed out slice by slice
+        # by the master or taken whole as a fallback
+        self.runner = None
+        self.stripe = None  # Indices of the store the master reserved for this worker and not yet sent
+        self.source = None  # "master" or "stripe", whichever supplied accounts first
+        self.assigned = set()
+        self.slice_pending = False
+        self.slice_received = Event()
+
+    @classmethod
+    def for_file(cls, file_path):
+        """Returns the shared pool for an Excel file or glob pattern, loading it on first use."""
+        pool = cls._pools.get(file_path)
+        if pool is None:
+            pool = cls(cls.load_store(file_path))
+            cls._pools[file_path] = pool
+            logging.info(f"Loaded {len(pool.credentials)} users from {file_path}.")
+        return pool
+
+    @classmethod
+    def load_store(cls, pattern):
+        """Merges every Excel file matching the pattern into one de-duplicated, indexed list."""
+        credentials = []
+        seen = set()
+        for file_path in sorted(glob.glob(pattern)) or [pattern]:
+            for email, password in cls.load_credentials(file_path):
+                if email not in seen:
+                    seen.add(email)
+                    credentials.append((email, password))
+        return credentials
+
+    @staticmethod
+    def load_credentials(file_path):
+        """Reads the email/password columns of an Excel sheet into a list of tuples."""
+        try:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+        except Exception as e:
+            logging.error(f"Error loading users from Excel: {e}")
+            return []
+
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip().lower() if cell is not None else "" for cell in next(rows, ())]
+            if "email" not in header or "password" not in header:
+                logging.error(f"Excel file {file_path} needs 'email' and 'password' columns.")
+                return []
+            email_column = header.index("email")
+            password_column = header.index("password")
+
+            credentials = []
+            for row in rows:
+                email = row[email_column] if email_column < len(row) else None
+                password = row[password_column] if password_column < len(row) else None
+                if email:
+                    credentials.append((str(email).strip(), "" if password is None else str(password)))
+            return credentials
+        finally:
+            workbook.close()
+
+    def attach_worker(self, runner):
+        """Switches the pool to distributed mode, where accounts come from master-assigned slices."""
+        self.runner = runner
+        self.available.clear()
+        self.checked_out.clear()
+
+    def add_slice(self, indices):
+        """Adds the given accounts of the merged store to this worker's pool."""
+        if self.source == "stripe":
+            logging.info(f"Ignoring a credential slice of {len(indices)} users, already using the whole worker stripe.")
+            return
+        self.source = "master"
+        indices = [index for index in indices if index < len(self.credentials) and index not in self.assigned]
+        random.shuffle(indices)
+        self.assigned.update(indices)
+        self.available.extend(indices)
+        logging.info(f"Received a credential slice of {len(indices)} users, {len(self.available)} users available.")
+
+    def request_slice(self):
+        """Asks the master for another slice and waits for it to arrive."""
+        if not self.slice_pending:
+            # Only one request in flight; other users running dry wait for the same answer
+            self.slice_pending = True
+            self.slice_received.clear()
+            self.runner.send_message(CREDENTIALS_REQUEST, {"size": configuration_system.credential_slice_size})
+        received = self.slice_received.wait(configuration_system.credential_slice_timeout)
+        self.slice_pending = False
+        if not received:
+            logging.warning("Master did not answer the credential request, using the whole worker stripe.")
+            self.add_stripe()
+
+    def add_stripe(self):
+        """Fallback: takes the rest of this worker's stripe at once; master slices come from it too."""
+        if self.source == "stripe":
+            return
+        if self.stripe is None:
+            logging.error("No credential stripe from the master, so no accounts are safe to use on this worker.")
+            return
+        self.source = "stripe"
+        indices = [index for index in self.stripe if index < len(self.credentials) and index not in self.assigned]
+        random.shuffle(indices)
+        self.assigned.update(indices)
+        self.available.extend(indices)
+        # Should the master come back, it must not hand these to a worker that joins later
+        self.runner.send_message(CREDENTIALS_REQUEST, {"whole_stripe": True})
+
+    def acquire(self):
+        """Checks out an unused account as a {"email", "password"} dict."""
+        if not self.available and self.runner is not None:
+            self.request_slice()
+        if not self.available:
+            raise ValueError("All users have been used.")
+        index = self.available.popleft()
+        self.checked_out.add(index)
+        email, password = self.credentials[index]
+        return {"email": email, "password": password}
+
+    def release(self, user):
+        """Returns a checked-out account to the pool so another user can reuse it."""
+        index = self.index_by_email.get(user["email"])
+        if index in self.checked_out:
+            self.checked_out.remove(index)
+            self.available.append(index)
+
+    def __len__(self):
+        return len(self.available)
+
+
+class AccountHolder:
+    """Mixin for users that check an agent account out of the shared pool into self.user."""
+
+    def get_unique_user(self):
+        # Check out an account from the shared, load-once credential pool
+        pool = CredentialPool.for_file(configuration_system.excel_file)
+        try:
+            return pool.acquire()
+        except ValueError:
+            self.logger.error("No more unique users available.")
+            raise
+
+    def release_user(self):
+        """Returns this user's account to the credential pool."""
+        if getattr(self, "user", None) is not None:
+            CredentialPool.for_file(configuration_system.excel_file).release(self.user)
+            self.user = None
+
+
+class CredentialBroker:
+    """
+    Runs on the master and gives each worker its own stripe of the merged credential store.
+    Slices are handed out from within that stripe, so a worker that falls back to taking its
+    whole stripe never overlaps another. A worker that joins later gets a share of the accounts
+    no worker has been sent yet: the rest of every stripe is split again, and the other workers
+    are sent their smaller stripes.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.stripes = {}  # Worker id -> indices of its stripe not handed out yet
+
+    def assign_stripes(self, runner):
+        """Splits the accounts not handed out yet between the connected workers when new ones joined."""
+        workers = sorted((worker.id for worker in runner.clients.values()), key=runner.get_worker_index)
+        if all(worker_id in self.stripes for worker_id in workers):
+            return
+        if self.stripes:
+            remaining = sorted(index for stripe in self.stripes.values() for index in stripe)
+        else:
+            remaining = list(range(self.total))
+        self.stripes = {}
+        for position, worker_id in enumerate(workers):
+            self.stripes[worker_id] = remaining[position::len(workers)]
+            runner.send_message(CREDENTIALS_STRIPE, {"indices": self.stripes[worker_id]}, client_id=worker_id)
+        logging.info(f"Split {len(remaining)} of {self.total} credentials into {len(workers)} worker stripes.")
+
+    def on_request(self, environment, msg, **kwargs):
+        if msg.node_id not in self.stripes:
+            # Joined after the credentials were split, e.g. a worker added during the run
+            self.assign_stripes(environment.runner)
+        stripe = self.stripes.get(msg.node_id, [])
+        if (msg.data or {}).get("whole_stripe"):
+            # The worker took its whole stripe without waiting for the master
+            size = len(stripe)
+        else:
+            size = max(int((msg.data or {}).get("size") or configuration_system.credential_slice_size), 1)
+        indices, self.stripes[msg.node_id] = stripe[:size], stripe[size:]
+        if not indices:
+            logging.warning(f"Credential stripe of worker {msg.node_id} exhausted, it gets no more users.")
+        environment.runner.send_message(CREDENTIALS_SLICE, {"indices": indices}, client_id=msg.node_id)
+
+
+def on_slice(environment, msg, **kwargs):
+    """Worker side: adds the slice sent by the master to the local pool."""
+    pool = CredentialPool.for_file(configuration_system.excel_file)
+    pool.add_slice(msg.data["indices"])
+    pool.slice_received.set()
+
+
+def on_stripe(environment, msg, **kwargs):
+    """Worker side: remembers which stripe of the store belongs to this worker; later splits shrink it."""
+    CredentialPool.for_file(configuration_system.excel_file).stripe = msg.data["indices"]
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        broker = CredentialBroker(len(CredentialPool.load_store(configuration_system.excel_file)))
+        runner.register_message(CREDENTIALS_REQUEST, broker.on_request)
+
+        @environment.events.test_start.add_listener
+        def on_test_start(**kwargs):
+            broker.assign_stripes(environment.runner)
+    elif isinstance(runner, WorkerRunner):
+        CredentialPool.for_file(configuration_system.excel_file).attach_worker(runner)
+        runner.register_message(CREDENTIALS_SLICE, on_slice)
+        runner.register_message(CREDENTIALS_STRIPE, on_stripe)
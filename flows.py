@@ -0,0 +1,19 @@
+"""One user class per flow of the scenario file; new flows need no code.
+
+    locust -f flows.py TicketFlow
+    locust -f flows.py,load_shape.py --headless   # Every flow, stepped up by the saturation shape
+"""
+from configuration import configuration_system
+import monitor  # noqa: F401 - samples this load generator while the test runs
+import samples  # noqa: F401 - records every request when record_samples is on
+from scenarios import ScenarioUser, load_flows
+
+for flow in load_flows().values():
+    globals()[flow.name] = type(flow.name, (ScenarioUser,), {
+        "__module__": __name__,
+        "__doc__": f"Runs the {flow.name} flow of {configuration_system.scenario_file}.",
+        "flow_name": flow.name,
+        "role": flow.role,  # Used by load_shape.py to bring agents online before visitors
+        "weight": flow.weight,
+        "sends_chat_messages": flow.sends_chat_messages,  # Needs chat_ack_selector, checked by transcript.py
+    })
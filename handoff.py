@@ -0,0 +1,113 @@
+import re
+import time
+import uuid
+
+# Visitor chats are stamped with an id that carries the epoch millisecond the visitor filled in
+# the pre-chat form, right before pressing btnStartChat. Any agent, in any process or on any
+# worker, can turn a sighting of that id into a handoff latency without a shared store, as long
+# as the load generators' clocks are in sync.
+CHAT_ID_PATTERN = re.compile(r"lt(\d{13})x[0-9a-f]{6}")
+
+# Prefix of the agent's reply, so the visitor can tell it apart from its own messages
+REPLY_PREFIX = "agent-reply-"
+
+# Agent console: records the epoch millisecond each stamped chat id first appears on the page and
+# claims the chat right then, by clicking the accept element (an XPath with {chat_id}), so the
+# acceptance is timed when the chat shows up rather than when the agent's iteration gets to it.
+# Every agent that sees the chat tries; the agent then checks whether it actually won the claim.
+WATCH_INCOMING_JS = """
+function (pattern, acceptXpath) {
+    if (window.__beelinksIncoming) {
+        return;
+    }
+    const incoming = window.__beelinksIncoming = {seen: {}, taken: {}};
+    const regex = new RegExp(pattern, 'g');
+    const claim = function (chatId) {
+        try {
+            const element = document.evaluate(acceptXpath.split('{chat_id}').join(chatId), document, null,
+                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            if (element) {
+                element.click();
+                return Date.now();
+            }
+        } catch (e) {}
+        return null;
+    };
+    const scan = function (node) {
+        const text = node && node.textContent;
+        if (!text) {
+            return;
+        }
+        const now = Date.now();
+        for (const match of text.matchAll(regex)) {
+            if (!(match[0] in incoming.seen) && !(match[0] in incoming.taken)) {
+                incoming.seen[match[0]] = {seen: now, accepted: null};
+                incoming.seen[match[0]].accepted = claim(match[0]);
+            }
+        }
+    };
+    new MutationObserver(function (mutations) {
+        for (const mutation of mutations) {
+            if (mutation.type === 'characterData') {
+                scan(mutation.target);
+            }
+            mutation.addedNodes.forEach(scan);
+        }
+    }).observe(document.body, {childList: true, subtree: true, characterData: true});
+    scan(document.body);
+}
+"""
+
+# Agent console: hands over the chat ids seen since the last call, as {chat id: {seen, accepted}}
+# with accepted null when the chat could not be claimed on sight
+TAKE_INCOMING_JS = """
+function () {
+    const incoming = window.__beelinksIncoming;
+    if (!incoming) {
+        return {};
+    }
+    const seen = incoming.seen;
+    Object.assign(incoming.taken, seen);
+    incoming.seen = {};
+    return seen;
+}
+"""
+
+# Visitor transcript: records the epoch millisecond the agent's reply first shows up
+WATCH_REPLY_JS = """
+function (tag) {
+    const state = window.__beelinksReply = {tag: tag, seen: null};
+    const check = function () {
+        if (state.seen === null && document.body.textContent.includes(tag)) {
+            state.seen = Date.now();
+            observer.disconnect();
+        }
+    };
+    const observer = new MutationObserver(check);
+    observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    check();
+}
+"""
+
+REPLY_SEEN_JS = """
+function (tag) {
+    const state = window.__beelinksReply;
+    return state && state.tag === tag ? state.seen : null;
+}
+"""
+
+
+def new_chat_id():
+    """Returns a chat id stamped with the current epoch millisecond."""
+    return f"lt{int(time.time() * 1000)}x{uuid.uuid4().hex[:6]}"
+
+
+def chat_started_ms(chat_id):
+    """Returns the epoch millisecond a chat id was stamped with, or None if it is not one of ours."""
+    match = CHAT_ID_PATTERN.fullmatch(chat_id)
+    return int(match.group(1)) if match else None
+
+
+def latency_since(chat_id, now_ms):
+    """Milliseconds between the visitor starting the chat and now_ms, clamped at zero for clock skew."""
+    return max(now_ms - chat_started_ms(chat_id), 0)
@@ -0,0 +1,21 @@
+"""A few browser users and many replay users in one run.
+
+    locust -f hybrid.py --headless -u 1000 -r 20
+
+hybrid_browser_users browser visitors and agents keep running the real chat.py and ticket.py
+flows; set record_traffic = True so they report every app request as "Browser <name>". All
+other users replay recorded traffic (replay.py) and report the same requests as
+"Replay <name>", so the two can be compared side by side.
+"""
+import chat
+import ticket
+from configuration import configuration_system
+from replay import ReplayAgent, ReplayVisitor  # noqa: F401 - the cheap users, weighted against each other
+
+
+class BrowserVisitor(chat.BeelinksUser):
+    fixed_count = configuration_system.hybrid_browser_users
+
+
+class BrowserAgent(ticket.BeelinksUser):
+    fixed_count = configuration_system.hybrid_browser_users
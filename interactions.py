@@ -0,0 +1,85 @@
+import logging
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
+
+# Fills every field and clicks the submit element in one round-trip. Values go through the
+# native value setter followed by focus/input/change/blur events, so framework bindings see
+# the same events a user typing would produce. Returns the id of the first element it could
+# not find, or null when the whole step ran.
+FILL_AND_SUBMIT_JS = """
+const fields = arguments[0], submitId = arguments[1];
+const elements = [];
+for (const [id] of fields) {
+    const element = document.getElementById(id);
+    if (!element) {
+        return id;
+    }
+    elements.push(element);
+}
+const submit = submitId ? document.getElementById(submitId) : null;
+if (submitId && (!submit || submit.disabled)) {
+    return submitId;
+}
+elements.forEach(function (element, index) {
+    const value = fields[index][1];
+    const setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(element), 'value').set;
+    element.focus();
+    setter.call(element, value);
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+    element.blur();
+});
+if (submit) {
+    submit.click();
+}
+return null;
+"""
+
+
+class Interactions:
+    """Runs whole UI steps as single scripted WebDriver commands, with a per-element fallback."""
+
+    def __init__(self, driver, environment):
+        self.driver = driver
+        self.environment = environment
+
+    def fill_and_submit(self, name, fields, submit_id=None):
+        """Fills (element id, value) pairs and clicks submit_id, reporting commands and driver time."""
+        start_time = time.time()
+        commands = 1
+        try:
+            missing = self.driver.execute_script(FILL_AND_SUBMIT_JS, [list(field) for field in fields], submit_id)
+        except WebDriverException as e:
+            logging.warning(f"Batched step {name} failed, falling back to per-element calls: {e}")
+            missing = name
+
+        if missing is not None:
+            try:
+                commands += self.fill_per_element(fields, submit_id)
+            except WebDriverException as e:
+                self.fire(name, None, commands, str(e))
+                raise
+        self.fire(name, (time.time() - start_time) * 1000, commands)
+
+    def fill_per_element(self, fields, submit_id):
+        """One find_element plus one send_keys per field, then the click; returns the command count."""
+        commands = 0
+        for element_id, value in fields:
+            self.driver.find_element(By.ID, element_id).send_keys(value)
+            commands += 2
+        if submit_id:
+            self.driver.find_element(By.ID, submit_id).click()
+            commands += 2
+        return commands
+
+    def fire(self, name, response_time, commands, exception=None):
+        # response_length carries the number of WebDriver commands the step took
+        self.environment.events.request.fire(
+            request_type="Step",
+            name=f"Step: {name}",
+            response_time=response_time,
+            response_length=commands,
+            exception=exception
+        )
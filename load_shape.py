@@ -0,0 +1,197 @@
+import json
+import logging
+import time
+
+from locust import LoadTestShape
+
+from configuration import configuration_system
+from monitor import GeneratorMonitor
+
+
+def percentile(histogram, percent):
+    """Percentile of a {rounded response time: count} histogram."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    threshold = total * percent
+    seen = 0
+    for response_time in sorted(histogram):
+        seen += histogram[response_time]
+        if seen >= threshold:
+            return response_time
+    return max(histogram)
+
+
+class StatsWindow:
+    """
+    Per-name request counts and response time histogram between two snapshots of the runner's stats.
+    Only real requests count: pseudo-request types (shape_ignore_types) are left out of the window.
+    """
+
+    def __init__(self, stats):
+        self.taken_at = time.time()
+        self.entries = {}
+        for (name, request_type), entry in stats.entries.items():
+            if request_type in configuration_system.shape_ignore_types:
+                continue
+            requests, failures, histogram = self.entries.get(name, (0, 0, {}))
+            histogram = dict(histogram)
+            for response_time, count in entry.response_times.items():
+                histogram[response_time] = histogram.get(response_time, 0) + count
+            self.entries[name] = (requests + entry.num_requests, failures + entry.num_failures, histogram)
+
+    def since(self, previous):
+        """Returns {name: (requests, failures, histogram)} for what happened after the previous snapshot."""
+        window = {}
+        for name, (requests, failures, histogram) in self.entries.items():
+            old_requests, old_failures, old_histogram = previous.entries.get(name, (0, 0, {}))
+            delta = {key: count - old_histogram.get(key, 0) for key, count in histogram.items()
+                     if count > old_histogram.get(key, 0)}
+            window[name] = (requests - old_requests, failures - old_failures, delta)
+        return window
+
+
+class SaturationShape(LoadTestShape):
+    """
+    Steps users up until the SLOs in configuration_system.shape_slo_p95 break.
+
+    Each step brings its agents online first and only then adds the step's visitors. The step is
+    held until the rolling p95 of the watched request names stabilises; a breached p95 or error
+    rate stops the test (or backs off to the last good step) and the max sustainable users and
+    throughput are logged and written to shape_report_file.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.step = 0
+        self.phase = "agents"
+        self.phase_started = None
+        self.snapshot = None
+        self.last_p95 = None
+        self.last_good = None  # (users, requests per second) of the last stable step within SLO
+        self.backoff_until = None
+        self.finished = False
+
+    def classes(self, role):
+        return [user_class for user_class in self.runner.user_classes
+                if getattr(user_class, "role", "visitor") == role]
+
+    def targets(self, step):
+        """Agent and visitor counts for a step."""
+        users = configuration_system.shape_start_users + step * configuration_system.shape_step_users
+        if not self.classes("agent"):
+            return 0, users
+        if not self.classes("visitor"):
+            return users, 0
+        agents = round(users * configuration_system.shape_agent_ratio)
+        return agents, users - agents
+
+    def tick(self):
+        if self.finished:
+            return None
+        if GeneratorMonitor.saturated is not None:
+            # Anything measured beyond this point would be the load generator's limit, not the server's
+            self.finish(f"load generator out of headroom ({GeneratorMonitor.saturated})")
+            return None
+        rate = configuration_system.shape_spawn_rate
+
+        if self.backoff_until is not None:
+            users, _ = self.last_good
+            return None if time.time() > self.backoff_until else (users, rate)
+
+        agents, visitors = self.targets(self.step)
+        _, previous_visitors = self.targets(self.step - 1) if self.step else (0, 0)
+
+        if self.phase == "agents":
+            # Only agent classes are spawned, so the step's visitors never arrive before them
+            if not agents or self.runner.user_count >= agents + previous_visitors:
+                self.start_phase("visitors")
+            else:
+                return agents + previous_visitors, rate, self.classes("agent")
+
+        if self.phase == "visitors":
+            if self.runner.user_count >= agents + visitors:
+                self.start_phase("hold")
+            else:
+                return agents + visitors, rate, self.classes("visitor")
+
+        return self.hold(agents + visitors, rate)
+
+    def start_phase(self, phase):
+        self.phase = phase
+        self.phase_started = time.time()
+        if phase == "hold":
+            self.snapshot = StatsWindow(self.runner.stats)
+            self.last_p95 = None
+
+    def hold(self, users, rate):
+        held = time.time() - self.phase_started
+        if time.time() - self.snapshot.taken_at < configuration_system.shape_window:
+            return users, rate
+
+        current = StatsWindow(self.runner.stats)
+        window = current.since(self.snapshot)
+        self.snapshot = current
+        elapsed = configuration_system.shape_window
+
+        # Error rate over every real request in the window; throughput counts the watched user-facing
+        # requests (chats started, logins) of the same window
+        requests = sum(count for count, _, _ in window.values())
+        failures = sum(count for _, count, _ in window.values())
+        throughput = sum(window[name][0] for name in configuration_system.shape_slo_p95 if name in window) / elapsed
+        error_rate = failures / requests if requests else 0.0
+
+        p95 = {}
+        breaches = []
+        for name, slo in configuration_system.shape_slo_p95.items():
+            if name in window:
+                p95[name] = percentile(window[name][2], 0.95)
+                if p95[name] is not None and p95[name] > slo:
+                    breaches.append(f"{name} p95 {p95[name]}ms > {slo}ms")
+        if error_rate > configuration_system.shape_max_error_rate:
+            breaches.append(f"error rate {error_rate:.1%} > {configuration_system.shape_max_error_rate:.1%}")
+
+        logging.info(f"Shape step {self.step}: {users} users, {throughput:.1f} req/s, "
+                     f"errors {error_rate:.1%}, p95 {p95}")
+        if breaches:
+            return self.breached(users, breaches)
+
+        stable = self.last_p95 is not None and all(
+            self.last_p95.get(name) and abs(value - self.last_p95[name]) / self.last_p95[name]
+            <= configuration_system.shape_stable_tolerance
+            for name, value in p95.items() if value is not None
+        )
+        self.last_p95 = p95
+        if (stable and held >= configuration_system.shape_min_hold) or held >= configuration_system.shape_max_hold:
+            self.last_good = (users, throughput)
+            if users + configuration_system.shape_step_users > configuration_system.shape_max_users:
+                self.finish("reached shape_max_users")
+                return None
+            self.step += 1
+            self.start_phase("agents")
+        return users, rate
+
+    def breached(self, users, breaches):
+        logging.warning(f"SLO breached at {users} users: {'; '.join(breaches)}")
+        if configuration_system.shape_on_breach == "backoff" and self.last_good is not None:
+            self.backoff_until = time.time() + configuration_system.shape_max_hold
+            self.report(f"backed off after breach at {users} users", breaches)
+            return self.last_good[0], configuration_system.shape_spawn_rate
+        self.finish(f"breach at {users} users", breaches)
+        return None
+
+    def finish(self, reason, breaches=()):
+        self.finished = True
+        self.report(reason, breaches)
+
+    def report(self, reason, breaches):
+        users, throughput = self.last_good or (0, 0.0)
+        result = {
+            "reason": reason,
+            "max_sustainable_users": users,
+            "throughput_rps": round(throughput, 2),
+            "breaches": list(breaches),
+        }
+        logging.info(f"Max sustainable users: {users} at {throughput:.1f} req/s ({reason})")
+        with open(configuration_system.shape_report_file, "w") as f:
+            json.dump(result, f, indent=2)
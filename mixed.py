@@ -0,0 +1,31 @@
+"""Visitors and agents in one run, stepped up by the saturation shape.
+
+    locust -f mixed.py
+
+Locust refuses two user classes with the same name, so the BeelinksUser classes of chat.py,
+activechat.py and ticket.py are re-exported here under their own names.
+"""
+import activechat
+import chat
+import ticket
+from configuration import configuration_system
+from load_shape import SaturationShape  # noqa: F401 - picked up by Locust as the run's shape
+
+if configuration_system.browser_contexts:
+    class ChatVisitor(chat.BeelinksContextUser):
+        pass
+
+    class ChatAgent(activechat.BeelinksContextUser):
+        pass
+
+    class TicketAgent(ticket.BeelinksContextUser):
+        pass
+else:
+    class ChatVisitor(chat.BeelinksUser):
+        pass
+
+    class ChatAgent(activechat.BeelinksUser):
+        pass
+
+    class TicketAgent(ticket.BeelinksUser):
+        pass
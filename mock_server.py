@@ -0,0 +1,418 @@
+"""Local stand-in for the Beelinks app and chat widget, so every user class can run offline.
+
+    python mock_server.py --port 8765 --chat-port 8766 --latency 0.05
+
+Point configuration.py at it with loadtestURL = "http://127.0.0.1:8765",
+chatWindowURL = "http://127.0.0.1:8766/" and chat_api_url = "http://127.0.0.1:8766".
+
+App site (--port), mirroring what ticket.py and activechat.py drive:
+    GET  /              login form (email, password, login-submit) or, once logged in, the agent
+                        console: nav-tickets, the avatar, the "Not Accepting Chats" checkbox,
+                        incoming visitor chats and the chatMessage reply box
+    POST /login         any non-empty email and password log in
+    GET  /tickets       the console plus a tickets table loaded from /tickets/list
+    GET  /agent/chats   visitor chats nobody else accepted yet
+    POST /agent/accept  {"session"} claims a chat, ok only for the first agent; POST /agent/reply
+                        {"session", "text"} pushes the owning agent's reply to the visitor
+
+Chat site (--chat-port), mirroring what chat.py drives:
+    GET  /              the widget: launcher iframe (title) and chat window iframe (btnChat,
+                        field3-5, btnStartChat, chatMessage and the transcript)
+
+Both sites, mirrored by BeelinksChatApiUser in chat.py:
+    POST /chat/start   pre-chat form fields -> {"session": ..., "socket": "/chat/socket?session=..."}
+    GET  /chat/socket  WebSocket; each {"type": "message", "id", "text"} frame is answered with
+                       {"type": "ack", "id"} and then echoed back as the transcript entry
+                       {"type": "message", "id", "from": "visitor", "text"}
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SESSION_COOKIE = "beelinks_session"
+
+LOGIN_PAGE = """<!doctype html>
+<html><head><meta name="csrf-token" content="{token}"><title>Beelinks - Login</title></head>
+<body>
+<form id="login-form" action="/login" method="post">
+    <input type="hidden" name="_token" value="{token}">
+    <input id="email" name="email" type="email">
+    <input id="password" name="password" type="password">
+    <button id="login-submit" type="submit">Login</button>
+</form>
+</body></html>
+"""
+
+# Agent console shared by / and /tickets; polls for visitor chats and sends replies
+CONSOLE_PAGE = """<!doctype html>
+<html><head><meta name="csrf-token" content="{token}"><title>Beelinks - {title}</title></head>
+<body>
+<ul id="nav"><li id="nav-tickets"><a href="/tickets">Tickets</a></li></ul>
+<div class="avatar ava-xs b-2">A</div>
+<a title="Not Accepting Chats"><input type="checkbox"></a>
+<ul id="incoming-chats"></ul>
+<input id="chatMessage" type="text">
+{content}
+<script>
+let selected = null;
+const list = document.getElementById('incoming-chats');
+function post(path, payload) {{
+    return fetch(path, {{method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify(payload)}});
+}}
+function poll() {{
+    fetch('/agent/chats').then(function (response) {{ return response.json(); }}).then(function (chats) {{
+        // Chats another agent claimed (or that ended) leave the list
+        const open = new Set(chats.map(function (chat) {{ return 'chat-' + chat.session; }}));
+        for (const item of Array.from(list.children)) {{
+            if (!open.has(item.id)) {{
+                item.remove();
+            }}
+        }}
+        for (const chat of chats) {{
+            if (document.getElementById('chat-' + chat.session)) {{
+                continue;
+            }}
+            const item = document.createElement('li');
+            item.id = 'chat-' + chat.session;
+            item.textContent = chat.name;
+            item.addEventListener('click', function () {{
+                selected = chat.session;
+                post('/agent/accept', {{session: chat.session}}).then(function (response) {{
+                    return response.json();
+                }}).then(function (result) {{
+                    if (result.ok) {{
+                        item.classList.add('claimed');
+                        return;
+                    }}
+                    item.remove();
+                    if (selected === chat.session) {{
+                        selected = null;
+                    }}
+                }});
+            }});
+            list.appendChild(item);
+        }}
+    }}).finally(function () {{ setTimeout(poll, 1000); }});
+}}
+document.getElementById('chatMessage').addEventListener('keydown', function (event) {{
+    if (event.key === 'Enter' && selected) {{
+        post('/agent/reply', {{session: selected, text: event.target.value}});
+        event.target.value = '';
+    }}
+}});
+poll();
+</script>
+</body></html>
+"""
+
+TICKETS_CONTENT = """<table id="tickets"></table>
+<script>
+fetch('/tickets/list').then(function (response) { return response.json(); }).then(function (tickets) {
+    const table = document.getElementById('tickets');
+    for (const ticket of tickets) {
+        const row = table.insertRow();
+        row.insertCell().textContent = ticket.id;
+        row.insertCell().textContent = ticket.subject;
+    }
+});
+</script>"""
+
+WIDGET_PAGE = """<!doctype html>
+<html><head><title>Beelinks chat</title></head>
+<body>
+<iframe id="launcher" src="/launcher"></iframe>
+<iframe id="window" src="/window"></iframe>
+</body></html>
+"""
+
+LAUNCHER_PAGE = """<!doctype html>
+<html><body><button id="title" type="button">Chat with us</button></body></html>
+"""
+
+WINDOW_PAGE = """<!doctype html>
+<html><body>
+<button id="btnChat" type="button">Start a chat</button>
+<form id="prechat" style="display: none">
+    <input id="field3" name="field3">
+    <input id="field4" name="field4">
+    <input id="field5" name="field5">
+    <button id="btnStartChat" type="button">Start chat</button>
+</form>
+<div id="chat" style="display: none">
+    <div id="transcript"></div>
+    <input id="chatMessage" type="text">
+</div>
+<script>
+let socket = null;
+document.getElementById('btnChat').addEventListener('click', function () {
+    document.getElementById('prechat').style.display = '';
+});
+document.getElementById('btnStartChat').addEventListener('click', function () {
+    const form = new URLSearchParams(new FormData(document.getElementById('prechat')));
+    fetch('/chat/start', {method: 'POST', body: form}).then(function (response) {
+        return response.json();
+    }).then(function (started) {
+        socket = new WebSocket('ws://' + location.host + started.socket);
+        socket.onopen = function () {
+            document.getElementById('prechat').style.display = 'none';
+            document.getElementById('chat').style.display = '';
+        };
+        socket.onmessage = function (event) {
+            const frame = JSON.parse(event.data);
+            if (frame.type === 'message') {
+                const line = document.createElement('div');
+                line.textContent = frame.from + ': ' + frame.text;
+                document.getElementById('transcript').appendChild(line);
+            }
+        };
+    });
+});
+document.getElementById('chatMessage').addEventListener('keydown', function (event) {
+    if (event.key === 'Enter' && socket) {
+        socket.send(JSON.stringify({type: 'message', id: Math.random().toString(16).slice(2), text: event.target.value}));
+        event.target.value = '';
+    }
+});
+</script>
+</body></html>
+"""
+
+
+class MockBeelinksHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0  # Seconds added before every response, set from --latency
+    sessions = {}  # Visitor chat session -> pre-chat form
+    sockets = {}  # Visitor chat session -> handler holding its WebSocket
+    accepted = {}  # Visitor chat session -> agent session that accepted it
+    agents = set()  # Logged-in agent sessions
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def send_body(self, body, content_type, status=200, headers=()):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload, status=200):
+        self.send_body(json.dumps(payload), "application/json", status)
+
+    def send_html(self, page, status=200, headers=()):
+        self.send_body(page, "text/html; charset=utf-8", status, headers)
+
+    def redirect(self, location, headers=()):
+        self.send_body("", "text/plain", 302, (("Location", location),) + tuple(headers))
+
+    def read_form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode() if length else ""
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw or "{}")
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+    def agent(self):
+        """Returns the logged-in agent session of the request, or None."""
+        cookie = SimpleCookie(self.headers.get("Cookie") or "")
+        session = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+        return session if session in self.agents else None
+
+    def console(self, title, content=""):
+        return CONSOLE_PAGE.format(token=uuid.uuid4().hex, title=title, content=content)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        self.delay()
+        if path == "/chat/start":
+            session = uuid.uuid4().hex
+            self.sessions[session] = self.read_form()
+            self.send_json({"session": session, "socket": f"/chat/socket?session={session}"})
+        elif path == "/login" and self.server.site == "app":
+            form = self.read_form()
+            if not form.get("email") or not form.get("password"):
+                self.send_html(LOGIN_PAGE.format(token=uuid.uuid4().hex), 422)
+                return
+            session = uuid.uuid4().hex
+            self.agents.add(session)
+            self.redirect("/", [("Set-Cookie", f"{SESSION_COOKIE}={session}; Path=/; HttpOnly")])
+        elif path == "/agent/accept" and self.agent():
+            session = self.read_form().get("session")
+            with self.lock:
+                owner = self.accepted.setdefault(session, self.agent()) if session in self.sessions else None
+            self.send_json({"ok": owner == self.agent()})
+        elif path == "/agent/reply" and self.agent():
+            form = self.read_form()
+            session = form.get("session")
+            # Only the agent that accepted the chat can answer it
+            handler = self.sockets.get(session) if self.accepted.get(session) == self.agent() else None
+            if handler is not None:
+                handler.write_frame(json.dumps({"type": "message", "from": "agent", "text": form.get("text")}))
+            self.send_json({"ok": handler is not None})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/chat/socket" and self.headers.get("Upgrade", "").lower() == "websocket":
+            session = parse_qs(url.query).get("session", [None])[0]
+            if session not in self.sessions:
+                self.send_json({"error": "unknown session"}, 403)
+                return
+            self.accept_websocket()
+            self.serve_chat(session)
+            return
+
+        self.delay()
+        if self.server.site == "chat":
+            pages = {"/": WIDGET_PAGE, "/launcher": LAUNCHER_PAGE, "/window": WINDOW_PAGE}
+            if url.path in pages:
+                self.send_html(pages[url.path])
+            else:
+                self.send_json({"error": "not found"}, 404)
+            return
+
+        agent = self.agent()
+        if url.path == "/":
+            self.send_html(self.console("Dashboard") if agent else LOGIN_PAGE.format(token=uuid.uuid4().hex))
+        elif url.path == "/tickets":
+            if agent:
+                self.send_html(self.console("Tickets", TICKETS_CONTENT))
+            else:
+                self.redirect("/")
+        elif url.path == "/tickets/list" and agent:
+            self.send_json([{"id": number, "subject": f"Ticket {number}"} for number in range(1, 26)])
+        elif url.path == "/agent/chats" and agent:
+            with self.lock:
+                chats = [{"session": session, "name": self.sessions[session].get("field3", "")}
+                         for session in list(self.sockets)
+                         if self.accepted.get(session, agent) == agent and session in self.sessions]
+            self.send_json(chats[-50:])
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def accept_websocket(self):
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+    def serve_chat(self, session):
+        # Agent replies are written from other request threads
+        self.write_lock = threading.Lock()
+        self.sockets[session] = self
+        try:
+            while True:
+                frame = self.read_frame()
+                if frame is None:
+                    return
+                try:
+                    message = json.loads(frame)
+                except ValueError:
+                    continue
+                if message.get("type") != "message":
+                    continue
+                self.delay()
+                self.write_frame(json.dumps({"type": "ack", "id": message.get("id")}))
+                self.delay()
+                self.write_frame(json.dumps({
+                    "type": "message", "id": message.get("id"), "from": "visitor", "text": message.get("text"),
+                }))
+        finally:
+            with self.lock:
+                self.sockets.pop(session, None)
+                self.accepted.pop(session, None)
+                self.sessions.pop(session, None)
+
+    def read_frame(self):
+        """Reads one (masked) client frame; returns its text, or None once the socket closes."""
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(self.rfile.read(length)))
+        if opcode == 0x8:
+            self.write_frame(b"", opcode=0x8)
+            return None
+        if opcode == 0x9:
+            self.write_frame(payload, opcode=0xA)
+            return ""
+        return payload.decode(errors="replace")
+
+    def write_frame(self, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self.write_lock:
+            self.wfile.write(header + payload)
+            self.wfile.flush()
+
+
+class MockBeelinksServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Users connect in bursts during ramp-up
+
+    def __init__(self, address, handler, site):
+        super().__init__(address, handler)
+        self.site = site  # "app" (testapp) or "chat" (testwindow)
+
+
+def serve(port, latency=0.0, site="chat"):
+    MockBeelinksHandler.latency = latency
+    return MockBeelinksServer(("127.0.0.1", port), MockBeelinksHandler, site)
+
+
+def serve_both(port, chat_port, latency=0.0):
+    """Starts the app and chat sites in background threads; returns both servers."""
+    servers = [serve(port, latency, "app"), serve(chat_port, latency, "chat")]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Beelinks app and chat widget.")
+    parser.add_argument("--port", type=int, default=8765, help="Agent app (loadtestURL)")
+    parser.add_argument("--chat-port", type=int, default=8766, help="Chat widget (chatWindowURL, chat_api_url)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before every response")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logging.info(f"Mock Beelinks app on http://127.0.0.1:{args.port}, chat widget on "
+                 f"http://127.0.0.1:{args.chat_port} (latency {args.latency}s)")
+    serve_both(args.port, args.chat_port, args.latency)
+    threading.Event().wait()
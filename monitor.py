@@ -0,0 +1,193 @@
+import csv
+import logging
+import os
+import socket
+import time
+
+import gevent
+import psutil
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+
+from configuration import configuration_system
+
+MB = 1024 * 1024
+
+
+def open_files(process):
+    # File descriptors on POSIX, handles on Windows
+    return process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+
+
+class GeneratorMonitor:
+    """
+    Samples CPU, memory and open files of this worker and of the browsers it started.
+
+    Each direct child process (chromedriver, or Playwright's driver) is counted as one browser
+    together with everything it launched. Samples are appended to monitor_file in results_dir and
+    kept as the latest gauges of this worker, which the master collects and the web UI shows at
+    /generator. They stay out of the request stats. Once the machine runs out of headroom for
+    monitor_breach_samples samples in a row, spawning is stopped at the current user count.
+    """
+
+    _shared = None
+    saturated = None  # Reason spawning was stopped, set on the process that runs the spawning
+    gauges = {}  # Worker -> {gauge name: latest value}; on the master, for every worker that reported
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.process = psutil.Process()
+        self.processes = {}  # Kept between samples so cpu_percent measures the interval since the last one
+        self.breaches = 0
+        self.sampler = None
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        os.makedirs(configuration_system.results_dir, exist_ok=True)
+        path = os.path.join(configuration_system.results_dir, configuration_system.monitor_file.format(worker=self.worker))
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(["timestamp", "worker", "scope", "pid", "cpu_percent", "rss_mb", "open_files"])
+
+    @classmethod
+    def shared(cls, environment):
+        """Returns this process's monitor, creating it on first use."""
+        if cls._shared is None:
+            cls._shared = cls(environment)
+        return cls._shared
+
+    def start(self):
+        if self.sampler is None or self.sampler.dead:
+            self.sampler = gevent.spawn(self.run)
+
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except psutil.Error as e:
+                logging.warning(f"Could not sample the load generator: {e}")
+            gevent.sleep(configuration_system.monitor_interval)
+
+    def tracked(self, process):
+        """Returns the cached psutil handle for a process, so its CPU counters carry over."""
+        cached = self.processes.get(process.pid)
+        if cached is None or cached.create_time() != process.create_time():
+            cached = self.processes[process.pid] = process
+        return cached
+
+    def measure(self, processes):
+        """Sums CPU %, RSS and open files over processes, skipping any that exited meanwhile."""
+        cpu = rss = files = 0
+        for process in processes:
+            try:
+                process = self.tracked(process)
+                cpu += process.cpu_percent(None)
+                rss += process.memory_info().rss
+                files += open_files(process)
+            except psutil.Error:
+                self.processes.pop(process.pid, None)
+        return cpu, rss / MB, files
+
+    def sample(self):
+        now = time.time()
+        gauges = {}
+        rows = [("worker", self.process.pid) + self.measure([self.process])]
+        for child in self.process.children():
+            try:
+                tree = [child] + child.children(recursive=True)
+            except psutil.Error:
+                continue
+            rows.append(("browser", child.pid) + self.measure(tree))
+
+        for scope, pid, cpu, rss, files in rows:
+            self.writer.writerow([round(now, 3), self.worker, scope, pid, round(cpu, 1), round(rss, 1), files])
+            label = "Worker" if scope == "worker" else "Browser"
+            # Browsers add up, the worker is a single row
+            gauges[f"{label} CPU %"] = round(gauges.get(f"{label} CPU %", 0) + cpu, 1)
+            gauges[f"{label} RSS MB"] = round(gauges.get(f"{label} RSS MB", 0) + rss, 1)
+            gauges[f"{label} open files"] = gauges.get(f"{label} open files", 0) + files
+        gauges["Browsers"] = len(rows) - 1
+
+        system_cpu = psutil.cpu_percent(None)
+        available = psutil.virtual_memory().available / MB
+        gauges["System CPU %"] = round(system_cpu, 1)
+        gauges["System memory available MB"] = round(available, 1)
+        GeneratorMonitor.gauges[self.worker] = gauges
+        self.writer.writerow([round(now, 3), self.worker, "system", "", round(system_cpu, 1), round(available, 1), ""])
+        self.file.flush()
+
+        self.check_headroom(system_cpu, available, rows[0][4])
+
+    def check_headroom(self, system_cpu, available, worker_files):
+        reasons = []
+        if system_cpu > configuration_system.monitor_max_cpu_percent:
+            reasons.append(f"CPU {system_cpu:.0f}% > {configuration_system.monitor_max_cpu_percent}%")
+        if available < configuration_system.monitor_min_available_mb:
+            reasons.append(f"available memory {available:.0f} MB < {configuration_system.monitor_min_available_mb} MB")
+        if configuration_system.monitor_max_open_files and worker_files > configuration_system.monitor_max_open_files:
+            reasons.append(f"open files {worker_files} > {configuration_system.monitor_max_open_files}")
+
+        self.breaches = self.breaches + 1 if reasons else 0
+        if self.breaches == configuration_system.monitor_breach_samples:
+            reason = f"{self.worker}: {', '.join(reasons)}"
+            if isinstance(self.environment.runner, WorkerRunner):
+                self.environment.runner.send_message("generator_saturated", reason)
+            else:
+                stop_spawning(self.environment, reason)
+
+    def close(self):
+        if self.sampler is not None:
+            self.sampler.kill()
+        self.file.close()
+
+
+def stop_spawning(environment, reason):
+    """Holds the run at its current user count; a load shape picks this up from GeneratorMonitor.saturated."""
+    if GeneratorMonitor.saturated is not None:
+        return
+    GeneratorMonitor.saturated = reason
+    runner = environment.runner
+    logging.warning(f"Load generator out of headroom ({reason}); no more users are spawned. "
+                    f"Latencies from here on may reflect the generator rather than the server.")
+    if environment.shape_class is None and runner.user_count:
+        runner.start(runner.user_count, max(getattr(runner, "spawn_rate", 0) or 1, 1))
+
+
+def on_saturated(environment, msg, **kwargs):
+    stop_spawning(environment, msg.data)
+
+
+@events.init.add_listener
+def on_locust_init(environment, web_ui=None, **kwargs):
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        runner.register_message("generator_saturated", on_saturated)
+
+        @environment.events.worker_report.add_listener
+        def on_worker_report(client_id, data, **kwargs):
+            GeneratorMonitor.gauges.update(data.get("generator", {}))
+    elif isinstance(runner, WorkerRunner):
+        @environment.events.report_to_master.add_listener
+        def on_report_to_master(client_id, data, **kwargs):
+            if GeneratorMonitor._shared is not None:
+                worker = GeneratorMonitor._shared.worker
+                data["generator"] = {worker: GeneratorMonitor.gauges.get(worker, {})}
+
+    if web_ui is not None:
+        @web_ui.app.route("/generator")
+        @web_ui.auth_required_if_enabled
+        def generator_gauges():
+            # Latest headroom gauges per worker, kept out of the request stats
+            return GeneratorMonitor.gauges
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    GeneratorMonitor.saturated = None
+    if configuration_system.monitor_interval and not isinstance(environment.runner, MasterRunner):
+        GeneratorMonitor.shared(environment).start()
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    if GeneratorMonitor._shared is not None:
+        GeneratorMonitor._shared.close()
@@ -0,0 +1,125 @@
+import logging
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+
+from configuration import configuration_system
+from readiness import RESOURCE_OBSERVER_JS
+
+# Registered before any page script runs (in every frame) so long tasks from the very start
+# of a load are captured; the guard keeps pooled browsers from registering it twice.
+LONG_TASK_JS = """
+(function () {
+    if (window.__beelinksLongTasks || !window.PerformanceObserver) {
+        return;
+    }
+    const tasks = window.__beelinksLongTasks = [];
+    try {
+        new PerformanceObserver(function (list) {
+            for (const entry of list.getEntries()) {
+                tasks.push([entry.startTime, entry.duration]);
+            }
+        }).observe({type: 'longtask', buffered: true});
+    } catch (e) {}
+})();
+"""
+
+# Reads the current document's Navigation Timing, its slowest resources and long tasks. With a
+# "since" mark (epoch ms taken by mark()) only what happened after it counts. Times are compared
+# as timeOrigin + startTime, so a mark taken in a document that has since been replaced by a full
+# navigation still works, and the new document's navigation is reported too. Resources come
+# from the page's resource observer, which does not stop at the timeline's 250 entries.
+COLLECT_JS = RESOURCE_OBSERVER_JS + """
+const since = arguments[0], slowest = arguments[1];
+const origin = performance.timeOrigin;
+const start = since === null ? origin : since;
+const result = {navigation: null, resources: [], settled: null, long_tasks: [0, 0]};
+if (origin >= start) {
+    const nav = performance.getEntriesByType('navigation')[0];
+    if (nav) {
+        result.navigation = {
+            ttfb: nav.responseStart - nav.requestStart,
+            dom_content_loaded: nav.domContentLoadedEventEnd - nav.startTime,
+            load: nav.loadEventEnd - nav.startTime
+        };
+    }
+}
+const resources = window.__loadtestResources.log.filter(function (entry) {
+    return entry[0] >= start;
+});
+for (const entry of resources) {
+    result.settled = Math.max(result.settled || 0, entry[1] - start);
+}
+result.resources = resources
+    .sort(function (a, b) { return (b[1] - b[0]) - (a[1] - a[0]); })
+    .slice(0, slowest)
+    .map(function (entry) { return [entry[2], entry[3], entry[1] - entry[0], entry[4]]; });
+for (const [startTime, duration] of (window.__beelinksLongTasks || [])) {
+    if (origin + startTime >= start) {
+        result.long_tasks[0] += 1;
+        result.long_tasks[1] += duration;
+    }
+}
+return result;
+"""
+
+
+class PageTiming:
+    """Reports the browser's own Navigation/Resource Timing and long tasks as Locust requests."""
+
+    def __init__(self, driver, environment):
+        self.driver = driver
+        self.environment = environment
+
+    def install(self):
+        """Starts recording long tasks in every document this browser loads from now on."""
+        if getattr(self.driver, "long_task_script", None) is not None:
+            return  # Pooled browser that already has it
+        try:
+            self.driver.long_task_script = self.driver.execute_cdp_cmd(
+                "Page.addScriptToEvaluateOnNewDocument", {"source": LONG_TASK_JS}
+            ).get("identifier")
+        except WebDriverException as e:
+            logging.warning(f"Could not install the long task observer: {e}")
+
+    def mark(self):
+        """Returns the current epoch ms in the browser's clock, to pass to collect() after a navigation."""
+        # Watching resources from here on keeps a busy SPA view countable past the timeline's limit
+        return self.driver.execute_script(RESOURCE_OBSERVER_JS + "return performance.timeOrigin + performance.now();")
+
+    def collect(self, label, since=None):
+        """Fires TTFB, DOMContentLoaded, load, settle time, slowest resources and long tasks for a page."""
+        try:
+            timing = self.driver.execute_script(COLLECT_JS, since, configuration_system.timing_slowest_resources)
+        except WebDriverException as e:
+            logging.warning(f"Could not read page timing for {label}: {e}")
+            return
+
+        navigation = timing.get("navigation")
+        if navigation:
+            self.fire(f"{label}: TTFB", navigation["ttfb"])
+            self.fire(f"{label}: DOMContentLoaded", navigation["dom_content_loaded"])
+            if navigation["load"] > 0:
+                self.fire(f"{label}: load", navigation["load"])
+        if timing.get("settled") is not None:
+            self.fire(f"{label}: resources settled", timing["settled"])
+
+        for url, initiator, duration, transfer_size in timing.get("resources") or []:
+            # One name per page, since which resources are slowest changes from run to run
+            parts = urlsplit(url)
+            logging.debug(f"{label}: slow {initiator} {parts.netloc}{parts.path} took {duration:.0f}ms")
+            self.fire(f"{label}: slowest resource", duration, transfer_size)
+
+        count, total = timing.get("long_tasks") or (0, 0)
+        if count:
+            # response_length carries the number of long tasks
+            self.fire(f"{label}: long tasks", total, count)
+
+    def fire(self, name, response_time, response_length=0):
+        self.environment.events.request.fire(
+            request_type="Page Timing",
+            name=name,
+            response_time=max(response_time, 0),
+            response_length=response_length,
+            exception=None
+        )
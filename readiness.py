@@ -0,0 +1,115 @@
+import time
+
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+from configuration import configuration_system
+
+# Counts every resource of the current document with a PerformanceObserver, installed on first
+# use and seeded from the timeline. The timeline buffer stops at 250 entries, the observer does
+# not. Keeps the absolute start and response end, URL, initiator and transfer size of the latest
+# resource_log_size resources.
+RESOURCE_OBSERVER_JS = """
+if (!window.__loadtestResources) {
+    const tracker = window.__loadtestResources = {count: 0, log: []};
+    const add = function (entry) {
+        tracker.count += 1;
+        tracker.log.push([performance.timeOrigin + entry.startTime, performance.timeOrigin + entry.responseEnd,
+                          entry.name, entry.initiatorType, entry.transferSize || 0]);
+        if (tracker.log.length > %d) {
+            tracker.log.shift();
+        }
+    };
+    performance.getEntriesByType('resource').forEach(add);
+    new PerformanceObserver(function (list) { list.getEntries().forEach(add); }).observe({entryTypes: ['resource']});
+}
+""" % configuration_system.resource_log_size
+
+
+class document_ready:
+    """Condition: the current document has finished loading."""
+
+    def __call__(self, driver):
+        return driver.execute_script("return document.readyState") == "complete"
+
+
+class network_idle:
+    """Condition: the document is loaded and no new resources were fetched for a quiet period."""
+
+    def __init__(self, quiet_period):
+        self.quiet_period = quiet_period
+        self.resource_count = None
+        self.since = None
+
+    def __call__(self, driver):
+        state, resource_count = driver.execute_script(
+            RESOURCE_OBSERVER_JS + "return [document.readyState, window.__loadtestResources.count];"
+        )
+        now = time.time()
+        if state != "complete" or resource_count != self.resource_count:
+            self.resource_count = resource_count
+            self.since = now
+            return False
+        return now - self.since >= self.quiet_period
+
+
+class Readiness:
+    """Event-driven waits that poll the real condition and report how long each one took."""
+
+    def __init__(self, driver, environment):
+        self.driver = driver
+        self.environment = environment
+
+    def until(self, name, condition, timeout):
+        """Waits for a condition, reporting the time spent under "Wait: <name>"."""
+        start_time = time.time()
+        try:
+            result = WebDriverWait(
+                self.driver, timeout, poll_frequency=configuration_system.readiness_poll_interval
+            ).until(condition)
+        except TimeoutException as e:
+            self.fire(name, None, f"Not ready after {timeout}s: {e.msg or name}")
+            raise
+        self.fire(name, (time.time() - start_time) * 1000)
+        return result
+
+    def optional(self, name, condition, timeout=None):
+        """Like until(), but returns None when the condition never holds (e.g. an element that may be absent)."""
+        timeout = configuration_system.optional_element_timeout if timeout is None else timeout
+        start_time = time.time()
+        try:
+            result = WebDriverWait(
+                self.driver, timeout, poll_frequency=configuration_system.readiness_poll_interval
+            ).until(condition)
+        except TimeoutException:
+            self.fire(f"{name} (absent)", (time.time() - start_time) * 1000)
+            return None
+        self.fire(name, (time.time() - start_time) * 1000)
+        return result
+
+    def page_loaded(self, timeout=120):
+        return self.until("page loaded", document_ready(), timeout)
+
+    def settled(self, timeout=30):
+        return self.until("network idle", network_idle(configuration_system.network_idle_quiet_period), timeout)
+
+    def clickable(self, name, by, value, timeout):
+        return self.until(name, EC.element_to_be_clickable((by, value)), timeout)
+
+    def present(self, name, by, value, timeout):
+        return self.until(name, EC.presence_of_element_located((by, value)), timeout)
+
+    def frame(self, name, locator, timeout):
+        """Waits for an iframe (index or locator) to be available and switches into it."""
+        self.driver.switch_to.default_content()
+        return self.until(name, EC.frame_to_be_available_and_switch_to_it(locator), timeout)
+
+    def fire(self, name, response_time, exception=None):
+        self.environment.events.request.fire(
+            request_type="Wait",
+            name=f"Wait: {name}",
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
@@ -0,0 +1,194 @@
+"""Hybrid mode, browser side: WebDriver users record the requests their browser sends.
+
+With record_traffic on, every WebDriver user of chat.py and ticket.py reads the Network events
+of Chrome's performance log after each step. It writes its first record_iterations iterations to
+a HAR-like file in recordings_dir, and keeps reporting every app request it makes as
+"Browser <name>" under the "Browser HTTP" request type. replay.py turns the recordings into
+HTTP users that report the same requests as "Replay <name>".
+"""
+import json
+import logging
+import os
+import re
+import socket
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, quote_plus, urlsplit
+
+from selenium.common.exceptions import WebDriverException
+
+from configuration import configuration_system
+
+# Path segments that identify one record (numeric ids, hex ids, UUIDs) are merged into one name
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12})$")
+
+
+def app_origins():
+    """Origins of the Beelinks servers; requests to any other host are neither reported nor replayed."""
+    return {
+        urlsplit(url).netloc: url
+        for url in (configuration_system.loadtestURL, configuration_system.chatWindowURL,
+                    configuration_system.chat_api_url)
+    }
+
+
+def request_name(method, url):
+    """Locust name of a request, shared by the browser and replay reports so the two line up."""
+    parts = urlsplit(url)
+    path = "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in parts.path.split("/"))
+    host = "" if parts.netloc == urlsplit(configuration_system.loadtestURL).netloc else parts.netloc
+    return f"{method} {host}{path or '/'}"
+
+
+def replayable(entry):
+    """True for recorded requests the replay users should send themselves."""
+    request = entry["request"]
+    return (entry["_resourceType"] in configuration_system.replay_resource_types
+            and urlsplit(request["url"]).netloc in app_origins()
+            and request["method"] != "OPTIONS")
+
+
+class TrafficRecorder:
+    """Turns one WebDriver user's Network events into HAR entries and "Browser HTTP" timings."""
+
+    def __init__(self, driver, environment, scenario):
+        self.driver = driver
+        self.environment = environment
+        self.scenario = scenario
+        self.enabled = configuration_system.record_traffic
+        self.pending = {}  # Chrome request id -> entry waiting for its response to finish
+        self.pages = []
+        self.entries = []
+        self.parameters = {}  # Recorded value -> placeholder the replay users fill in
+        self.saved = False
+
+    def parameter(self, name, value):
+        """Marks a value this user typed in (credentials, chat ids) so replay users substitute their own."""
+        if not value:
+            return
+        value = str(value)
+        # As typed, form-encoded and inside JSON strings
+        for variant in (value, quote_plus(value), quote(value, safe=""), json.dumps(value)[1:-1]):
+            self.parameters[variant] = "${" + name + "}"
+
+    def start_page(self, title):
+        """Starts a new page (on_start or one task iteration); requests sent from now on belong to it."""
+        if not self.enabled or self.saved:
+            return
+        if title == "iteration" and sum(page["title"] == title for page in self.pages) >= \
+                configuration_system.record_iterations:
+            self.save()
+            return
+        self.pages.append({
+            "startedDateTime": datetime.now(timezone.utc).isoformat(),
+            "id": f"page_{len(self.pages) + 1}",
+            "title": title,
+            "_started": time.time(),
+        })
+
+    def capture(self):
+        """
+        Drains the performance log and returns its raw entries, so ResourcePolicy.report can count
+        them too; None when not recording, in which case the resource policy reads the log itself.
+        """
+        if not self.enabled:
+            return None
+        try:
+            log = self.driver.get_log("performance")
+        except WebDriverException as e:
+            logging.warning(f"Could not read the browser's network log: {e}")
+            return []
+        for item in log:
+            message = json.loads(item["message"])["message"]
+            params = message["params"]
+            if message["method"] == "Network.requestWillBeSent":
+                if "redirectResponse" in params and params["requestId"] in self.pending:
+                    # The same request id continues at the redirect target
+                    self.finish(self.pending.pop(params["requestId"]), params["timestamp"],
+                                params["redirectResponse"])
+                self.begin(params)
+            elif message["method"] == "Network.responseReceived" and params["requestId"] in self.pending:
+                self.pending[params["requestId"]]["_response"] = params["response"]
+            elif message["method"] == "Network.loadingFinished" and params["requestId"] in self.pending:
+                self.finish(self.pending.pop(params["requestId"]), params["timestamp"], None,
+                            params.get("encodedDataLength", 0))
+            elif message["method"] == "Network.loadingFailed" and params["requestId"] in self.pending:
+                entry = self.pending.pop(params["requestId"])
+                if not params.get("blockedReason"):
+                    self.report(entry, None, 0, params.get("errorText", "Request failed"))
+        return log
+
+    def begin(self, params):
+        request = params["request"]
+        self.pending[params["requestId"]] = {
+            "startedDateTime": datetime.fromtimestamp(params["wallTime"], timezone.utc).isoformat(),
+            "request": {
+                "method": request["method"],
+                "url": request["url"],
+                "headers": [{"name": name, "value": value} for name, value in request.get("headers", {}).items()],
+                "postData": {"text": request["postData"]} if "postData" in request else None,
+            },
+            "_resourceType": params.get("type", "Other"),
+            "_redirected": "redirectResponse" in params,  # Replay users follow redirects themselves
+            "_wallTime": params["wallTime"],
+            "_timestamp": params["timestamp"],
+        }
+
+    def finish(self, entry, timestamp, response, size=0):
+        entry["time"] = (timestamp - entry.pop("_timestamp")) * 1000
+        received = entry.pop("_response", None)
+        response = response or received or {}
+        entry["response"] = {
+            "status": response.get("status", 0),
+            "content": {"mimeType": response.get("mimeType", ""), "size": size},
+        }
+        self.report(entry, entry["time"], size)
+        self.store(entry)
+
+    def report(self, entry, response_time, size, exception=None):
+        if not replayable(entry):
+            return
+        request = entry["request"]
+        self.environment.events.request.fire(
+            request_type="Browser HTTP",
+            name=f"Browser {request_name(request['method'], request['url'])}",
+            response_time=response_time,
+            response_length=size,
+            exception=exception
+        )
+
+    def store(self, entry):
+        # Requests sent before the first page or after the last recorded iteration are only timed
+        started = entry.pop("_wallTime")
+        page = next((page for page in reversed(self.pages) if page["_started"] <= started), None)
+        if page is None or self.saved:
+            return
+        entry["pageref"] = page["id"]
+        self.entries.append(entry)
+
+    def redact(self, text):
+        # Longest first, so a value that contains another one is replaced whole
+        for value in sorted(self.parameters, key=len, reverse=True):
+            text = text.replace(value, self.parameters[value])
+        return text
+
+    def save(self):
+        """Writes the recording once, with the typed-in values replaced by their placeholders."""
+        if not self.enabled or self.saved or not self.entries:
+            return
+        self.saved = True
+        os.makedirs(configuration_system.recordings_dir, exist_ok=True)
+        name = f"{self.scenario}-{socket.gethostname()}-{os.getpid()}-{id(self):x}.har"
+        recording = {"log": {
+            "version": "1.2",
+            "creator": {"name": "beelinks-loadtest", "version": "1"},
+            "pages": [{key: value for key, value in page.items() if key != "_started"}
+                      for page in self.pages],
+            "entries": self.entries,
+            "_scenario": self.scenario,
+            "_parameters": sorted(set(self.parameters.values())),
+        }}
+        path = os.path.join(configuration_system.recordings_dir, name)
+        with open(path, "w") as f:
+            f.write(self.redact(json.dumps(recording, indent=1)))
+        logging.info(f"Recorded {len(self.entries)} requests to {path}.")
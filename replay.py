@@ -0,0 +1,220 @@
+"""Hybrid mode, HTTP side: turns browser recordings into replay users.
+
+    python replay.py recordings/*.har --output replay.json
+    locust -f replay.py ReplayAgent
+
+The generator keeps the app requests of each recording (replay_resource_types, Beelinks hosts
+only) in their recorded order and pacing. It replaces the servers' origins, the credentials and
+chat ids the browser typed in, and CSRF tokens with ${placeholders}. ReplayAgent and
+ReplayVisitor fill those in with their own Excel account, a fresh chat id and the token of the
+last page they loaded. Cookies, session ids included, live in each user's HTTP session.
+Requests are reported as "Replay <name>", next to the "Browser <name>" of the browser users.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime
+from string import Template
+from urllib.parse import parse_qsl, quote_plus, urlsplit
+
+import gevent
+from locust import HttpUser, task, between
+
+import ticket
+from configuration import configuration_system
+from arrival import arrival_wait
+from credentials import AccountHolder
+import monitor  # noqa: F401 - samples this load generator while the test runs
+import samples  # noqa: F401 - records every request when record_samples is on
+from handoff import new_chat_id
+from recording import replayable, request_name
+
+TOKEN_FIELDS = ticket.LoginPageParser.CSRF_FIELDS
+TOKEN_HEADERS = ("x-csrf-token", "x-xsrf-token")
+KEPT_HEADERS = ("content-type", "accept", "x-requested-with") + TOKEN_HEADERS  # Cookies come from the session
+
+
+def origins():
+    """Placeholder name of each Beelinks server origin, as currently configured."""
+    placeholders = {}
+    for name, url in (("app", configuration_system.loadtestURL), ("chat_window", configuration_system.chatWindowURL),
+                      ("chat_api", configuration_system.chat_api_url)):
+        parts = urlsplit(url)
+        placeholders.setdefault(f"{parts.scheme}://{parts.netloc}", name)
+    return placeholders
+
+
+def recorded_tokens(entries):
+    """CSRF token values the browser sent in form fields, JSON bodies or headers."""
+    tokens = set()
+    for entry in entries:
+        request = entry["request"]
+        for header in request["headers"]:
+            if header["name"].lower() in TOKEN_HEADERS:
+                tokens.add(header["value"])
+        body = (request.get("postData") or {}).get("text") or ""
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            fields = dict(parse_qsl(body))
+        if isinstance(fields, dict):
+            tokens.update(str(value) for name, value in fields.items() if name in TOKEN_FIELDS and value)
+    return tokens
+
+
+def generate(paths):
+    """Returns the replay script for the given recordings: one flow per recording."""
+    flows = []
+    for path in paths:
+        with open(path) as f:
+            log = json.load(f)["log"]
+
+        replacements = {origin: "${" + name + "}" for origin, name in origins().items()}
+        for token in recorded_tokens(log["entries"]):
+            replacements[token] = replacements[quote_plus(token)] = "${csrf_token}"
+
+        def template(text):
+            for value in sorted(replacements, key=len, reverse=True):
+                text = text.replace(value, replacements[value])
+            return text
+
+        def steps(page):
+            started = datetime.fromisoformat(page["startedDateTime"])
+            result = []
+            for entry in log["entries"]:
+                if entry.get("pageref") != page["id"] or entry["_redirected"] or not replayable(entry):
+                    continue
+                request = entry["request"]
+                body = (request.get("postData") or {}).get("text")
+                result.append({
+                    "name": request_name(request["method"], request["url"]),
+                    "method": request["method"],
+                    "url": template(request["url"]),
+                    "headers": {header["name"]: template(header["value"]) for header in request["headers"]
+                                if header["name"].lower() in KEPT_HEADERS},
+                    "body": None if body is None else template(body),
+                    "at": round(max((datetime.fromisoformat(entry["startedDateTime"]) - started).total_seconds(), 0), 3),
+                    "status": entry["response"]["status"],
+                })
+            return result
+
+        start = [step for page in log["pages"] if page["title"] == "start" for step in steps(page)]
+        iterations = [steps(page) for page in log["pages"] if page["title"] == "iteration"]
+        flows.append({
+            "scenario": log["_scenario"],
+            "recording": path,
+            "parameters": log["_parameters"],
+            "start": start,
+            "iterations": [iteration for iteration in iterations if iteration],
+        })
+    return {"flows": flows}
+
+
+class ReplayUser(AccountHolder, HttpUser):
+    """Replays the recorded flows of one scenario over plain HTTP."""
+
+    abstract = True
+    scenario = None
+    wait_time = arrival_wait(between(5, 10))
+    _script = None
+
+    @classmethod
+    def flows(cls):
+        if ReplayUser._script is None:
+            with open(configuration_system.replay_script) as f:
+                ReplayUser._script = json.load(f)
+        return [flow for flow in ReplayUser._script["flows"] if flow["scenario"] == cls.scenario]
+
+    def on_start(self):
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        flows = self.flows()
+        if not flows:
+            raise ValueError(f"No {self.scenario} recordings in {configuration_system.replay_script}")
+        self.flow = random.choice(flows)
+
+        self.variables = {name: origin for origin, name in origins().items()}
+        self.variables["csrf_token"] = ""
+        self.variables["chat_id"] = new_chat_id()
+        self.user = None
+        if "${email}" in self.flow["parameters"] or "${password}" in self.flow["parameters"]:
+            self.user = self.get_unique_user()
+            self.variables["email"] = self.user["email"]
+            self.variables["password"] = self.user["password"]
+
+        self.run_steps(self.flow["start"])
+
+    def on_stop(self):
+        self.release_user()
+
+    def run_steps(self, steps):
+        """Sends the steps in order, never earlier after the start than the browser sent them."""
+        start_time = time.time()
+        for step in steps:
+            delay = step["at"] - (time.time() - start_time)
+            if delay > 0:
+                gevent.sleep(delay)
+            self.send(step)
+
+    def fill(self, text, encode=False):
+        variables = self.variables
+        if encode:
+            variables = {name: quote_plus(value) for name, value in variables.items()}
+        return Template(text).safe_substitute(variables)
+
+    def send(self, step):
+        body = step["body"]
+        if body is not None:
+            form = any(name.lower() == "content-type" and "x-www-form-urlencoded" in value
+                       for name, value in step["headers"].items())
+            body = self.fill(body, encode=form).encode()
+        with self.client.request(step["method"], self.fill(step["url"]), data=body,
+                                 headers={name: self.fill(value) for name, value in step["headers"].items()},
+                                 name=f"Replay {step['name']}", catch_response=True) as response:
+            if response.status_code >= 400 and step["status"] < 400:
+                response.failure(f"{response.status_code}, the browser got {step['status']}")
+            elif "html" in response.headers.get("Content-Type", ""):
+                # Pages carry the CSRF token later requests have to send
+                token = ticket.LoginPageParser.parse(response.text).csrf_token
+                if token:
+                    self.variables["csrf_token"] = token
+
+    @task
+    def replay(self):
+        if self.flow["iterations"]:
+            self.run_steps(random.choice(self.flow["iterations"]))
+
+
+class ReplayAgent(ReplayUser):
+    """Agent replaying ticket.py recordings."""
+
+    scenario = "ticket"
+    role = "agent"
+    host = configuration_system.loadtestURL
+
+
+class ReplayVisitor(ReplayUser):
+    """Chat visitor replaying chat.py recordings (the pages and form posts; WebSocket messages are not replayed)."""
+
+    scenario = "chat"
+    role = "visitor"
+    host = configuration_system.chat_api_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn browser recordings into a replay script.")
+    parser.add_argument("paths", nargs="+", help="Recordings, e.g. recordings/*.har")
+    parser.add_argument("--output", default=configuration_system.replay_script, help="Replay script to write")
+    args = parser.parse_args()
+
+    script = generate(args.paths)
+    with open(args.output, "w") as f:
+        json.dump(script, f, indent=1)
+    for flow in script["flows"]:
+        print(f"{flow['recording']}: {flow['scenario']}, {len(flow['start'])} start steps, "
+              f"{len(flow['iterations'])} iterations", file=sys.stderr)
@@ -0,0 +1,169 @@
+import fnmatch
+import json
+import logging
+import random
+
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+from selenium.common.exceptions import WebDriverException
+
+from configuration import configuration_system
+
+# Network.setBlockedURLs only matches URLs, so resource types are blocked by file extension in WebDriver mode
+TYPE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*"],
+    "stylesheet": ["*.css*"],
+}
+
+FULL = "full"  # Name reported for users that load everything
+
+
+def policies_in_use():
+    return bool(configuration_system.resource_policy or configuration_system.scenario_resource_policies)
+
+
+class ResourcePolicy:
+    """
+    Keeps one user's browser from loading what its scenario's resource policy denies.
+
+    WebDriver users block through Network.setBlockedURLs and count from Chrome's performance log;
+    shared-browser users route every request of their context through allowed(). Both add blocked
+    requests and loaded kilobytes to the totals per policy, which workers send to the master and
+    the web UI shows at /resources. They stay out of the request stats.
+    """
+
+    totals = {}  # Policy name -> {"reports", "blocked requests", "KB loaded"}; workers send theirs since the last report
+
+    def __init__(self, environment, name, rules):
+        self.environment = environment
+        self.name = name
+        self.rules = rules or {}
+        self.blocked = 0
+        self.loaded = 0
+        self.driver = None
+
+    @classmethod
+    def for_user(cls, user):
+        """Picks the policy of the user's scenario (its locustfile), or full loading for the baseline sample."""
+        name = configuration_system.resource_policy
+        for user_class in type(user).__mro__:
+            if user_class.__module__ in configuration_system.scenario_resource_policies:
+                name = configuration_system.scenario_resource_policies[user_class.__module__]
+                break
+        if not name or random.random() < configuration_system.resource_full_fidelity_share:
+            return cls(user.environment, FULL, None)
+        return cls(user.environment, name, configuration_system.resource_policies[name])
+
+    def blocked_patterns(self):
+        patterns = list(self.rules.get("block_urls", []))
+        for resource_type in self.rules.get("block_types", []):
+            patterns.extend(TYPE_PATTERNS.get(resource_type, []))
+        return patterns
+
+    def allowed(self, url, resource_type):
+        """True when a request may load; allow_urls win over everything else."""
+        if any(fnmatch.fnmatch(url, pattern) for pattern in self.rules.get("allow_urls", [])):
+            return True
+        if resource_type in self.rules.get("block_types", []):
+            return False
+        return not any(fnmatch.fnmatch(url, pattern) for pattern in self.rules.get("block_urls", []))
+
+    def apply(self, driver):
+        """Starts blocking in a WebDriver browser; BrowserPool.reset lifts it again."""
+        self.driver = driver
+        if self.name == FULL:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_patterns()})
+        except WebDriverException as e:
+            logging.warning(f"Could not apply the {self.name} resource policy: {e}")
+
+    def report(self, entries=None):
+        """
+        Fires what the browser blocked and loaded since the last report. Pass the performance log
+        entries when something else (TrafficRecorder.capture) already drained the log.
+        """
+        if not policies_in_use():
+            return
+        if self.driver is None:
+            self.flush()  # Shared-browser contexts count as their requests happen
+            return
+        if entries is None:
+            try:
+                entries = self.driver.get_log("performance")
+            except WebDriverException as e:
+                logging.warning(f"Could not read the browser's network log: {e}")
+                return
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFinished":
+                self.loaded += message["params"].get("encodedDataLength", 0)
+            elif message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                self.blocked += 1
+        self.flush()
+
+    async def route(self, route):
+        """Playwright route handler for shared-browser contexts."""
+        request = route.request
+        if self.allowed(request.url, request.resource_type):
+            await route.continue_()
+        else:
+            self.blocked += 1
+            await route.abort("blockedbyclient")
+
+    async def finished(self, request):
+        """Playwright requestfinished handler; adds the request's size to the loaded bytes."""
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.loaded += sizes["responseHeadersSize"] + sizes["responseBodySize"]
+
+    def flush(self):
+        totals = ResourcePolicy.totals.setdefault(self.name, {"reports": 0, "blocked requests": 0, "KB loaded": 0})
+        totals["reports"] += 1
+        totals["blocked requests"] += self.blocked
+        totals["KB loaded"] += self.loaded / 1024
+        self.blocked = self.loaded = 0
+
+
+def add_totals(totals):
+    for name, counts in totals.items():
+        merged = ResourcePolicy.totals.setdefault(name, {"reports": 0, "blocked requests": 0, "KB loaded": 0})
+        for key, value in counts.items():
+            merged[key] += value
+
+
+@events.init.add_listener
+def on_locust_init(environment, web_ui=None, **kwargs):
+    runner = environment.runner
+    if isinstance(runner, MasterRunner):
+        @environment.events.worker_report.add_listener
+        def on_worker_report(client_id, data, **kwargs):
+            add_totals(data.get("resources", {}))
+    elif isinstance(runner, WorkerRunner):
+        @environment.events.report_to_master.add_listener
+        def on_report_to_master(client_id, data, **kwargs):
+            data["resources"] = ResourcePolicy.totals
+            ResourcePolicy.totals = {}
+
+    if web_ui is not None:
+        @web_ui.app.route("/resources")
+        @web_ui.auth_required_if_enabled
+        def resource_totals():
+            # Per policy, with the averages per report (one per iteration) to compare against the full baseline
+            return {
+                name: dict(counts, **{
+                    "blocked requests per report": round(counts["blocked requests"] / max(counts["reports"], 1), 2),
+                    "KB loaded per report": round(counts["KB loaded"] / max(counts["reports"], 1), 1),
+                })
+                for name, counts in ResourcePolicy.totals.items()
+            }
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    ResourcePolicy.totals = {}
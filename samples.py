@@ -0,0 +1,262 @@
+"""Raw-sample recorder and offline report.
+
+While a test runs, every request event is appended to one file per worker process in
+configuration_system.samples_dir, as msgpack blocks of columns (timestamp, request type, name,
+latency, success, user, worker). Each worker also keeps mergeable latency histograms that the
+master combines into histograms.json.
+
+    python samples.py samples/*.samples --window 60 [--name "Chat initiated"] [--csv report.csv]
+
+reports exact percentiles per time window, streaming the files so only one window is in memory.
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import time
+import weakref
+
+import gevent
+import msgpack
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+
+from configuration import configuration_system
+
+COLUMNS = ("timestamp", "request_type", "name", "latency", "success", "user", "worker")
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the spirit of HdrHistogram: values are kept to a fixed number
+    of significant digits (in microseconds), so histograms from any worker merge by adding counts.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = {int(key): count for key, count in (counts or {}).items()}
+
+    @staticmethod
+    def bucket(latency_ms):
+        # Rounded to the nearest bucket, so the error is at most half a step and not biased low
+        micros = max(latency_ms * 1000, 0)
+        digits = configuration_system.histogram_significant_digits
+        if micros < 10 ** digits:
+            return round(micros)
+        magnitude = 10 ** (len(str(int(micros))) - digits)
+        return round(micros / magnitude) * magnitude
+
+    def record(self, latency_ms):
+        key = self.bucket(latency_ms)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def merge(self, counts):
+        for key, count in counts.items():
+            key = int(key)
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, percent):
+        """Returns the latency in ms below which the given share of samples falls."""
+        threshold = math.ceil(self.total() * percent)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= threshold:
+                return key / 1000
+        return None
+
+
+class SampleRecorder:
+    """Streams this process's request events to its sample file and histograms."""
+
+    _shared = None
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self.file = None  # Opened with the first block, so the master leaves no empty file behind
+        self.rows = {column: [] for column in COLUMNS}
+        self.pending = {}  # Histogram counts not yet reported to the master
+        self.histograms = {}  # Whole-run histograms (master, or a run without workers)
+        self.user_ids = weakref.WeakKeyDictionary()
+        self.user_sequence = itertools.count(1)
+        self.flusher = gevent.spawn(self.flush_periodically)
+
+    @classmethod
+    def shared(cls, environment):
+        """Returns this process's recorder, creating it on first use."""
+        if cls._shared is None:
+            cls._shared = cls(environment)
+        return cls._shared
+
+    def user_id(self):
+        # Locust runs each user in its own greenlet, with the user as the greenlet's first argument
+        user = (getattr(gevent.getcurrent(), "args", None) or (None,))[0]
+        if user is None or not hasattr(user, "environment"):
+            return ""
+        if user not in self.user_ids:
+            self.user_ids[user] = f"{type(user).__name__}-{next(self.user_sequence)}"
+        return self.user_ids[user]
+
+    def record(self, request_type, name, response_time, exception):
+        rows = self.rows
+        rows["timestamp"].append(time.time())
+        rows["request_type"].append(request_type)
+        rows["name"].append(name)
+        rows["latency"].append(response_time)
+        rows["success"].append(exception is None)
+        rows["user"].append(self.user_id())
+        rows["worker"].append(self.worker)
+        if response_time is not None and exception is None:
+            self.pending.setdefault(name, LatencyHistogram()).record(response_time)
+        if len(rows["timestamp"]) >= configuration_system.samples_block_rows:
+            self.flush()
+
+    def flush(self):
+        """Appends the buffered rows as one block of columns."""
+        if not self.rows["timestamp"]:
+            return
+        if self.file is None:
+            os.makedirs(configuration_system.samples_dir, exist_ok=True)
+            self.file = open(os.path.join(configuration_system.samples_dir, f"{self.worker}.samples"), "ab")
+        self.file.write(msgpack.packb(self.rows, use_bin_type=True))
+        self.file.flush()
+        self.rows = {column: [] for column in COLUMNS}
+
+    def flush_periodically(self):
+        while True:
+            gevent.sleep(configuration_system.samples_flush_interval)
+            self.flush()
+
+    def take_pending(self):
+        pending, self.pending = self.pending, {}
+        return {name: histogram.counts for name, histogram in pending.items()}
+
+    def merge(self, histograms):
+        for name, counts in histograms.items():
+            self.histograms.setdefault(name, LatencyHistogram()).merge(counts)
+
+    def write_histograms(self, log=True):
+        """Writes the combined histograms and logs their percentiles."""
+        self.merge(self.take_pending())
+        os.makedirs(configuration_system.samples_dir, exist_ok=True)
+        path = os.path.join(configuration_system.samples_dir, "histograms.json")
+        with open(path, "w") as f:
+            json.dump({name: histogram.counts for name, histogram in self.histograms.items()}, f)
+        if not log:
+            return
+        for name, histogram in sorted(self.histograms.items()):
+            logging.info(f"{name}: {histogram.total()} samples, p50 {histogram.percentile(0.5)}ms, "
+                         f"p95 {histogram.percentile(0.95)}ms, p99 {histogram.percentile(0.99)}ms, "
+                         f"p99.9 {histogram.percentile(0.999)}ms")
+
+    def close(self):
+        self.flusher.kill()
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    if not configuration_system.record_samples:
+        return
+
+    if isinstance(environment.runner, MasterRunner):
+        @environment.events.worker_report.add_listener
+        def on_worker_report(client_id, data, **kwargs):
+            SampleRecorder.shared(environment).merge(data.get("histograms", {}))
+        return
+
+    @environment.events.request.add_listener
+    def on_request(request_type, name, response_time, exception=None, **kwargs):
+        SampleRecorder.shared(environment).record(request_type, name, response_time, exception)
+
+    if isinstance(environment.runner, WorkerRunner):
+        @environment.events.report_to_master.add_listener
+        def on_report_to_master(client_id, data, **kwargs):
+            data["histograms"] = SampleRecorder.shared(environment).take_pending()
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    if configuration_system.record_samples and not isinstance(environment.runner, WorkerRunner):
+        SampleRecorder.shared(environment).write_histograms()
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    if SampleRecorder._shared is not None:
+        if not isinstance(environment.runner, WorkerRunner):
+            # Again, now that the workers' last reports are in
+            SampleRecorder._shared.write_histograms(log=False)
+        SampleRecorder._shared.close()
+
+
+def read_samples(path):
+    """Yields a file's rows as dicts, one block at a time."""
+    with open(path, "rb") as f:
+        for block in msgpack.Unpacker(f, raw=False):
+            for values in zip(*(block[column] for column in COLUMNS)):
+                yield dict(zip(COLUMNS, values))
+
+
+def report(paths, window, names=None, output=sys.stdout):
+    """Writes exact percentiles per time window and request name across the given sample files."""
+    writer = csv.writer(output)
+    writer.writerow(["window_start", "name", "requests", "failures", "p50", "p95", "p99", "p99.9", "max"])
+
+    def percentile(ordered, percent):
+        return round(ordered[max(math.ceil(len(ordered) * percent) - 1, 0)], 1)
+
+    def write_window(start, samples):
+        for name in sorted(samples):
+            latencies, failures = samples[name]
+            latencies.sort()
+            row = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)), name,
+                   len(latencies) + failures, failures]
+            if latencies:
+                row += [percentile(latencies, p) for p in (0.5, 0.95, 0.99, 0.999)] + [round(latencies[-1], 1)]
+            writer.writerow(row)
+
+    # Each worker appends in time order, so merging the files keeps only the current window in memory
+    rows = heapq.merge(*(read_samples(path) for path in paths), key=lambda row: row["timestamp"])
+    current, samples = None, {}
+    for row in rows:
+        if names and row["name"] not in names:
+            continue
+        start = row["timestamp"] - row["timestamp"] % window
+        if start != current:
+            if current is not None:
+                write_window(current, samples)
+            current, samples = start, {}
+        latencies, failures = samples.setdefault(row["name"], ([], 0))
+        if row["success"] and row["latency"] is not None:
+            latencies.append(row["latency"])
+        else:
+            samples[row["name"]] = (latencies, failures + 1)
+    if current is not None:
+        write_window(current, samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact percentiles per time window from recorded samples.")
+    parser.add_argument("paths", nargs="+", help="Sample files, e.g. samples/*.samples")
+    parser.add_argument("--window", type=float, default=60, help="Window length in seconds")
+    parser.add_argument("--name", action="append", dest="names", help="Only these request names (repeatable)")
+    parser.add_argument("--csv", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            report(args.paths, args.window, args.names, f)
+    else:
+        report(args.paths, args.window, args.names)
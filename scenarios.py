@@ -0,0 +1,354 @@
+"""Declarative browser flows: ordered steps read from configuration_system.scenario_file.
+
+Each flow names its role, whether it needs an Excel account, the steps run once in on_start and
+the steps of every task iteration. A step is a dict with a "type" and an optional "name":
+
+    navigate   url (or "reload": true), optional "timing" label for the page's browser timing
+    wait_for   locator and "state" (clickable, present, visible), or state page_loaded/network_idle
+    fill       "fields" as [element id, value] pairs and an optional "submit" element id
+    click      locator
+    assert     locator (optionally with "text") or "url_contains"
+    frame      iframe index or locator to switch into; null switches back to the page
+    pause      "seconds" to wait on purpose
+    action     a built-in step from ACTIONS, e.g. "chat_message"
+
+Locators are "id=...", "css=...", "xpath=..." or "name=..."; wait_for, click and assert take a
+"timeout" in seconds and "optional": true for elements that may be absent. Values may use
+${email}, ${password}, ${chat_id}, ${loadtestURL} and ${chatWindowURL}.
+
+Steps are compiled once per process. Every step is reported under "<flow>: <step>" (request type
+"Scenario"), and split into "<flow>: <step> [server]", the time until the last network response
+the step caused, and "<flow>: <step> [own]", the rest: our polling, WebDriver round-trips and
+deliberate pauses.
+"""
+import json
+import logging
+import time
+from functools import lru_cache
+from string import Template
+
+from locust import HttpUser, task, between
+from selenium.webdriver import Keys
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from configuration import configuration_system
+from arrival import arrival_wait, scheduled_start
+from handoff import new_chat_id
+from interactions import FILL_AND_SUBMIT_JS
+from readiness import RESOURCE_OBSERVER_JS, document_ready, network_idle
+from sessions import BrowserSession
+from transcript import WATCH_MESSAGE_JS, WAIT_MESSAGE_JS, ack_selector, new_message_tag
+
+LOCATOR_STRATEGIES = {"id": By.ID, "css": By.CSS_SELECTOR, "xpath": By.XPATH, "name": By.NAME}
+
+ELEMENT_STATES = {
+    "clickable": EC.element_to_be_clickable,
+    "present": EC.presence_of_element_located,
+    "visible": EC.visibility_of_element_located,
+}
+
+# Epoch ms at which the last response arrived for the requests started after the given epoch ms,
+# in the current document (navigation included), or null when there were none
+LAST_RESPONSE_JS = RESOURCE_OBSERVER_JS + """
+const since = arguments[0];
+let last = null;
+const responses = performance.getEntriesByType('navigation').map(function (entry) {
+    return [performance.timeOrigin + entry.startTime, performance.timeOrigin + entry.responseEnd];
+}).concat(window.__loadtestResources.log);
+for (const [start, end] of responses) {
+    if (start >= since && end > performance.timeOrigin) {
+        last = Math.max(last || 0, end);
+    }
+}
+return last;
+"""
+
+
+@lru_cache(maxsize=None)
+def compile_locator(text):
+    """Turns "xpath=//a" into (By.XPATH, "//a"); a bare value is an element id."""
+    strategy, separator, value = text.partition("=")
+    if separator and strategy in LOCATOR_STRATEGIES:
+        return LOCATOR_STRATEGIES[strategy], value
+    return By.ID, text
+
+
+class Step:
+    """One compiled step of a flow."""
+
+    def __init__(self, definition):
+        self.type = definition["type"]
+        if self.type not in STEP_TYPES:
+            raise ValueError(f"Unknown step type {self.type!r}")
+        self.definition = definition
+        self.locator = compile_locator(definition["locator"]) if definition.get("locator") else None
+        self.timeout = definition.get("timeout", 30)
+        self.optional = definition.get("optional", False)
+        target = (definition.get("locator") or definition.get("url") or definition.get("url_contains")
+                  or definition.get("action") or definition.get("state"))
+        self.name = definition.get("name") or f"{self.type} {target or ''}".strip()
+
+        frame = definition.get("frame")
+        self.frame = compile_locator(frame) if isinstance(frame, str) else frame
+
+        # network_idle keeps state across polls, so wait_for creates that condition per run
+        state = definition.get("state", "clickable")
+        self.condition = None
+        if self.type == "wait_for":
+            if state in ELEMENT_STATES:
+                if self.locator is None:
+                    raise ValueError(f"{self.name}: wait_for with state {state!r} needs a locator")
+                self.condition = ELEMENT_STATES[state](self.locator)
+            elif state == "page_loaded":
+                self.condition = document_ready()
+            elif state != "network_idle":
+                raise ValueError(f"{self.name}: unknown wait_for state {state!r}")
+        elif self.type == "click" and self.locator is None:
+            raise ValueError(f"{self.name}: click needs a locator")
+        elif self.type == "action" and definition.get("action") not in ACTIONS:
+            raise ValueError(f"{self.name}: unknown action {definition.get('action')!r}")
+
+    def get(self, key, default=None):
+        return self.definition.get(key, default)
+
+
+class Flow:
+    """A named flow compiled from the scenario file."""
+
+    def __init__(self, name, definition):
+        self.name = name
+        self.role = definition.get("role", "visitor")
+        self.weight = definition.get("weight", 1)
+        self.credentials = definition.get("credentials", False)
+        self.iteration_name = definition.get("iteration_name")
+        self.start = [Step(step) for step in definition.get("start", [])]
+        self.task = [Step(step) for step in definition.get("task", [])]
+        self.sends_chat_messages = any(step.type == "action" and step.get("action") == "chat_message"
+                                       for step in self.start + self.task)
+        names = [step.name for step in self.start + self.task]
+        duplicates = sorted({step_name for step_name in names if names.count(step_name) > 1})
+        if duplicates:
+            raise ValueError(f"{name}: steps need unique names to be reported apart: {', '.join(duplicates)}")
+
+
+_flows = {}  # Compiled flows per scenario file
+
+
+def load_flows(path=None):
+    """Returns the flows of a scenario file, compiling them on first use."""
+    path = path or configuration_system.scenario_file
+    if path not in _flows:
+        with open(path) as f:
+            _flows[path] = {name: Flow(name, definition) for name, definition in json.load(f).items()}
+    return _flows[path]
+
+
+def chat_message(user, step):
+    """Sends a tagged chat message; the in-page round-trip to the transcript counts as server time."""
+    tag = new_message_tag()
+    timeout = configuration_system.chat_echo_timeout
+    driver = user.driver
+    driver.execute_script(f"return ({WATCH_MESSAGE_JS})(arguments[0], arguments[1]);",
+                          tag, ack_selector())
+    chat_input = driver.find_element(*(step.locator or (By.ID, "chatMessage")))
+    chat_input.send_keys(f"test message {tag}")
+    chat_input.send_keys(Keys.RETURN)
+    driver.set_script_timeout(timeout + 5)
+    round_trip = driver.execute_script(f"return ({WAIT_MESSAGE_JS})(arguments[0], arguments[1]);",
+                                       tag, timeout * 1000)
+    if round_trip is None:
+        raise AssertionError(f"Message not in transcript after {timeout}s")
+    return round_trip
+
+
+# Built-in steps for what plain steps cannot express; each returns its server time in ms or None
+ACTIONS = {"chat_message": chat_message}
+
+# Failures a step reports and that stop its flow, e.g. a missing element or a setting a step needs
+STEP_ERRORS = (WebDriverException, AssertionError, ValueError)
+
+
+class ScenarioUser(BrowserSession, HttpUser):
+    """WebDriver user that runs one flow of the scenario file."""
+
+    abstract = True
+    uses_browser_pool = True
+    wait_time = arrival_wait(between(5, 10))
+    flow_name = None
+
+    def on_start(self):
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.flow = load_flows()[self.flow_name]
+        self.recording = self.flow_name
+        self.user = None
+        self.start_browser()
+
+        self.variables = {
+            "loadtestURL": configuration_system.loadtestURL,
+            "chatWindowURL": configuration_system.chatWindowURL,
+            "chat_id": new_chat_id(),
+        }
+        self.recorder.parameter("chat_id", self.variables["chat_id"])
+        if self.flow.credentials:
+            self.user = self.get_unique_user()
+            self.variables["email"] = self.user["email"]
+            self.variables["password"] = self.user["password"]
+            self.recorder.parameter("email", self.user["email"])
+            self.recorder.parameter("password", self.user["password"])
+
+        self.recorder.start_page("start")
+        error = self.run_steps(self.flow.start)
+        if error is not None:
+            self.on_stop()
+            raise error
+
+    @task
+    def run_task(self):
+        start_time = scheduled_start(self)
+        self.recorder.start_page("iteration")
+        error = self.run_steps(self.flow.task)
+        if self.flow.iteration_name:
+            self.fire(self.flow.iteration_name, None if error else (time.time() - start_time) * 1000,
+                      None if error is None else str(error), request_type="UI Interaction")
+        self.resources.report(self.recorder.capture())
+
+    def run_steps(self, steps):
+        """Runs steps in order, stopping at the first failure; returns that failure or None."""
+        for step in steps:
+            try:
+                self.run_step(step)
+            except STEP_ERRORS as e:
+                self.logger.error(f"{self.flow_name}: {step.name} failed: {e}")
+                return e
+        return None
+
+    def run_step(self, step):
+        start_time = time.time()
+        try:
+            server_time = STEP_TYPES[step.type](self, step)
+        except STEP_ERRORS as e:
+            self.fire(f"{self.flow_name}: {step.name}", None, str(e))
+            raise
+        total = (time.time() - start_time) * 1000
+        if server_time is None:
+            server_time = self.server_time(start_time)
+        self.fire(f"{self.flow_name}: {step.name}", total)
+        if server_time is not None:
+            self.fire(f"{self.flow_name}: {step.name} [server]", server_time)
+            self.fire(f"{self.flow_name}: {step.name} [own]", max(total - server_time, 0))
+
+    def server_time(self, start_time):
+        """Time from the step's start until the last response it caused (0 without requests)."""
+        if not configuration_system.scenario_server_timing:
+            return None
+        try:
+            last_response = self.driver.execute_script(LAST_RESPONSE_JS, start_time * 1000)
+        except WebDriverException:
+            return None
+        if last_response is None:
+            return 0.0
+        # Clamped to the step, since the report of the response can only arrive within it
+        return min(max(last_response - start_time * 1000, 0.0), (time.time() - start_time) * 1000)
+
+    def wait(self, step, condition):
+        """Polls a condition for the step's timeout; returns None when an optional element stays absent."""
+        try:
+            return WebDriverWait(
+                self.driver, step.timeout, poll_frequency=configuration_system.readiness_poll_interval
+            ).until(condition)
+        except TimeoutException:
+            if step.optional:
+                return None
+            raise TimeoutException(f"{step.name}: not ready after {step.timeout}s")
+
+    def fill_in(self, text):
+        return Template(text).safe_substitute(self.variables) if isinstance(text, str) else text
+
+    def fire(self, name, response_time, exception=None, request_type="Scenario"):
+        self.environment.events.request.fire(
+            request_type=request_type,
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=exception
+        )
+
+
+def navigate(user, step):
+    if step.get("reload"):
+        user.driver.refresh()
+    else:
+        user.driver.get(user.fill_in(step.get("url")))
+    if step.get("timing"):
+        user.timing.collect(step.get("timing"))
+
+
+def wait_for(user, step):
+    if step.get("state") == "network_idle":
+        user.wait(step, network_idle(configuration_system.network_idle_quiet_period))
+    else:
+        user.wait(step, step.condition)
+
+
+def fill(user, step):
+    if any("${chat_id}" in str(value) for _, value in step.get("fields", [])):
+        # Stamped right before the form is submitted, so agents time the handoff from the click
+        user.variables["chat_id"] = new_chat_id()
+        user.recorder.parameter("chat_id", user.variables["chat_id"])
+    fields = [[element_id, user.fill_in(value)] for element_id, value in step.get("fields", [])]
+    submit_id = step.get("submit")
+    missing = user.driver.execute_script(FILL_AND_SUBMIT_JS, fields, submit_id)
+    if missing is not None:
+        user.interactions.fill_per_element(fields, submit_id)
+
+
+def click(user, step):
+    element = user.wait(step, EC.element_to_be_clickable(step.locator))
+    if element is not None:
+        element.click()
+
+
+def check(user, step):
+    if step.get("url_contains") is not None:
+        expected = user.fill_in(step.get("url_contains"))
+        condition = EC.url_contains(expected)
+    elif step.get("text") is not None:
+        condition = EC.text_to_be_present_in_element(step.locator, user.fill_in(step.get("text")))
+    else:
+        condition = EC.presence_of_element_located(step.locator)
+    try:
+        user.wait(step, condition)
+    except TimeoutException:
+        raise AssertionError(f"{step.name} does not hold after {step.timeout}s")
+
+
+def frame(user, step):
+    user.driver.switch_to.default_content()
+    if step.frame is not None:
+        user.wait(step, EC.frame_to_be_available_and_switch_to_it(step.frame))
+
+
+def pause(user, step):
+    time.sleep(step.get("seconds", 1))
+
+
+def action(user, step):
+    return ACTIONS[step.get("action")](user, step)
+
+
+STEP_TYPES = {
+    "navigate": navigate,
+    "wait_for": wait_for,
+    "fill": fill,
+    "click": click,
+    "assert": check,
+    "frame": frame,
+    "pause": pause,
+    "action": action,
+}
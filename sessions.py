@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from configuration import configuration_system
+from browser import BrowserPool
+from credentials import AccountHolder
+from interactions import Interactions
+from page_timing import PageTiming
+from readiness import Readiness
+from recording import TrafficRecorder
+from resources import ResourcePolicy
+
+# Puts the saved localStorage back before the app's own scripts run, on the app origin only
+RESTORE_STORAGE_JS = """
+(function (origin, items) {
+    if (location.origin !== origin) {
+        return;
+    }
+    for (const key of Object.keys(items)) {
+        localStorage.setItem(key, items[key]);
+    }
+})(%s, %s);
+"""
+
+DUMP_STORAGE_JS = """
+const items = {};
+for (let index = 0; index < localStorage.length; index++) {
+    const key = localStorage.key(index);
+    items[key] = localStorage.getItem(key);
+}
+return [location.origin, items];
+"""
+
+
+class SessionCache:
+    """On-disk cache of logged-in agent sessions (cookies and localStorage), one file per email."""
+
+    _shared = None
+
+    def __init__(self, environment, directory, ttl):
+        self.environment = environment
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def shared(cls, environment):
+        """Returns this process's cache, creating its directory on first use."""
+        if cls._shared is None:
+            cls._shared = cls(environment, configuration_system.session_cache_dir, configuration_system.session_cache_ttl)
+        return cls._shared
+
+    def path(self, email):
+        return os.path.join(self.directory, hashlib.sha1(email.lower().encode()).hexdigest() + ".json")
+
+    def load(self, email):
+        """Returns the stored session for an email, or None if there is none or it has expired."""
+        try:
+            with open(self.path(email)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("saved_at", 0) > self.ttl:
+            self.delete(email)
+            return None
+        return entry
+
+    def delete(self, email):
+        try:
+            os.remove(self.path(email))
+        except OSError:
+            pass
+
+    def save(self, driver, email, login_ms):
+        """Stores the browser's cookies and localStorage after a successful UI login."""
+        try:
+            origin, local_storage = driver.execute_script(DUMP_STORAGE_JS)
+            entry = {
+                "email": email,
+                "saved_at": time.time(),
+                "login_ms": login_ms,
+                "origin": origin,
+                "cookies": driver.get_cookies(),
+                "local_storage": local_storage,
+            }
+        except WebDriverException as e:
+            logging.warning(f"Could not capture the session for {email}: {e}")
+            return
+
+        # Write then rename, so workers sharing the directory never read a half-written file
+        path = self.path(email)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(entry, f)
+        os.replace(temporary, path)
+
+    def restore(self, ready, email):
+        """Injects a stored session and opens the app; returns False when a real login is needed."""
+        start_time = time.time()
+        entry = self.load(email)
+        if entry is None:
+            self.fire("miss", 0)
+            return False
+
+        driver = ready.driver
+        now = time.time()
+        cookies = [self.to_cdp_cookie(cookie) for cookie in entry["cookies"]
+                   if not cookie.get("expiry") or cookie["expiry"] > now]
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+            script = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+                "source": RESTORE_STORAGE_JS % (json.dumps(entry["origin"]), json.dumps(entry["local_storage"]))
+            })
+            try:
+                driver.get(configuration_system.loadtestURL)
+                # Whichever shows up first tells us if the session is still good
+                ready.until("session check", EC.any_of(
+                    EC.presence_of_element_located((By.XPATH, configuration_system.logged_in_xpath)),
+                    EC.presence_of_element_located((By.ID, "login-submit")),
+                ), 120)
+            finally:
+                driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script["identifier"]})
+            valid = bool(driver.find_elements(By.XPATH, configuration_system.logged_in_xpath))
+        except (TimeoutException, WebDriverException) as e:
+            logging.warning(f"Could not restore the session for {email}: {e}")
+            valid = False
+
+        restore_ms = (time.time() - start_time) * 1000
+        if not valid:
+            # Stale: forget it and start the real login from a clean slate
+            self.delete(email)
+            try:
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except WebDriverException:
+                pass
+            self.fire("stale", restore_ms)
+            return False
+
+        self.fire("hit", restore_ms)
+        self.fire("login time saved", max(entry.get("login_ms", 0) - restore_ms, 0))
+        return True
+
+    @staticmethod
+    def to_cdp_cookie(cookie):
+        """Converts a WebDriver cookie dict to the shape Network.setCookies expects."""
+        converted = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly")
+                     if key in cookie}
+        if cookie.get("expiry"):
+            converted["expires"] = cookie["expiry"]
+        if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+            converted["sameSite"] = cookie["sameSite"]
+        return converted
+
+    def fire(self, name, response_time):
+        self.environment.events.request.fire(
+            request_type="Session Cache",
+            name=name,
+            response_time=response_time,
+            response_length=0,
+            exception=None
+        )
+
+
+class BrowserSession(AccountHolder):
+    """
+    Mixin for the WebDriver users: a browser leased from the worker's pool with the helpers that
+    drive and time it, an agent account logged in through the form or a cached session, and
+    handing both back on stop. recording names the user's traffic recordings.
+    """
+
+    recording = None
+
+    def start_browser(self):
+        """Leases a warm browser from the worker's pool instead of cold-starting Chrome."""
+        try:
+            self.driver = BrowserPool.shared(self.environment).lease()
+        except WebDriverException as e:
+            self.logger.error(f"Error setting up the browser: {e}")
+            raise
+        self.ready = Readiness(self.driver, self.environment)
+        self.interactions = Interactions(self.driver, self.environment)
+        self.timing = PageTiming(self.driver, self.environment)
+        self.timing.install()
+        self.resources = ResourcePolicy.for_user(self)
+        self.resources.apply(self.driver)
+        self.recorder = TrafficRecorder(self.driver, self.environment, self.recording)
+        self.logger.info("Chrome browser started successfully.")
+
+    def start_session(self):
+        """Checks out an account and logs it in, reusing a stored session when there is a valid one."""
+        self.sessions = SessionCache.shared(self.environment) if configuration_system.session_cache else None
+        self.user = self.get_unique_user()
+        self.recorder.parameter("email", self.user["email"])
+        self.recorder.parameter("password", self.user["password"])
+        self.recorder.start_page("start")
+
+        try:
+            if self.sessions is not None and self.sessions.restore(self.ready, self.user["email"]):
+                self.logger.info(f"Restored the session for {self.user['email']}.")
+            else:
+                self.login()
+
+        except TimeoutException as e:
+            self.logger.error(f"TimeoutException during login: {e}")
+            self.release_browser()
+            self.release_user()
+            raise
+        except Exception as e:
+            self.logger.error(f"An error occurred during login: {e}")
+            self.release_browser()
+            self.release_user()
+            raise
+
+    def login(self):
+        """Logs in through the login form, storing the session afterwards when caching is on."""
+        start_time = time.time()
+
+        # Open the login page
+        self.driver.get(configuration_system.loadtestURL)
+        self.logger.info(f"Opened URL: {self.driver.current_url}")
+
+        # Wait for the document to finish loading
+        self.ready.page_loaded(120)
+        self.timing.collect("Login page")
+
+        # Wait for the login button, then fill the form and submit it in one driver round-trip
+        self.logger.info("Waiting for login form...")
+        self.ready.clickable("login button", By.ID, "login-submit", 120)
+        self.interactions.fill_and_submit("login", [
+            ("email", self.user["email"]),
+            ("password", self.user["password"]),
+        ], "login-submit")
+
+        if self.sessions is not None:
+            self.ready.present("logged in", By.XPATH, configuration_system.logged_in_xpath, 120)
+            self.sessions.save(self.driver, self.user["email"], (time.time() - start_time) * 1000)
+
+    def release_browser(self):
+        """Returns the browser to the worker's pool, which resets its cookies and storage."""
+        if hasattr(self, 'driver'):
+            BrowserPool.shared(self.environment).release(self.driver)
+            del self.driver
+
+    def on_stop(self):
+        # Keep what was recorded, then return the browser and hand the account back for recycling
+        if hasattr(self, 'driver') and hasattr(self, 'recorder'):
+            self.recorder.capture()
+            self.recorder.save()
+        self.release_browser()
+        self.release_user()
@@ -0,0 +1,42 @@
+import asyncio
+
+import gevent
+import pytest
+
+from contexts import SharedBrowser
+
+
+async def answer(value, delay=0):
+    await asyncio.sleep(delay)
+    return value
+
+
+@pytest.fixture
+def browser():
+    # No browser is launched: plain coroutines exercise the event loop on its own
+    browser = SharedBrowser()
+    yield browser
+    browser.close()
+
+
+def test_loop_survives_an_idle_period(browser):
+    assert browser.run(answer(1)) == 1
+    gevent.sleep(2)
+    assert not browser.turning.dead
+    assert browser.run(answer(2, delay=0.1)) == 2
+
+
+def test_users_keep_running_while_a_step_waits(browser):
+    step = gevent.spawn(browser.run, answer("step", delay=0.5))
+    ticks = 0
+    while not step.ready():
+        ticks += 1
+        gevent.sleep(0.05)
+    assert step.get() == "step"
+    assert ticks > 1
+
+
+def test_step_past_its_timeout_fails_instead_of_hanging(browser):
+    with pytest.raises(TimeoutError):
+        browser.run(answer(None, delay=5), timeout=0.2)
+    assert browser.run(answer(3)) == 3
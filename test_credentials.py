@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from credentials import CREDENTIALS_SLICE, CREDENTIALS_STRIPE, CredentialBroker, CredentialPool
+
+
+class FakeMaster:
+    """Stands in for the master runner: connected workers and the messages sent to them."""
+
+    def __init__(self, *worker_ids):
+        self.clients = {}
+        self.sent = []
+        for worker_id in worker_ids:
+            self.connect(worker_id)
+
+    def connect(self, worker_id):
+        self.clients[worker_id] = SimpleNamespace(id=worker_id)
+
+    def get_worker_index(self, worker_id):
+        return list(self.clients).index(worker_id)
+
+    def send_message(self, msg_type, data=None, client_id=None):
+        self.sent.append((msg_type, data, client_id))
+
+    def messages(self, msg_type, client_id):
+        return [data for sent_type, data, to in self.sent if sent_type == msg_type and to == client_id]
+
+
+def request(broker, runner, worker_id, **data):
+    broker.on_request(SimpleNamespace(runner=runner), SimpleNamespace(node_id=worker_id, data=data))
+    return runner.messages(CREDENTIALS_SLICE, worker_id)[-1]["indices"]
+
+
+def test_slices_never_overlap_and_late_workers_get_the_rest():
+    runner = FakeMaster("a", "b")
+    broker = CredentialBroker(100)
+    broker.assign_stripes(runner)
+
+    handed_out = {"a": request(broker, runner, "a", size=10), "b": request(broker, runner, "b", size=10)}
+    runner.connect("late")
+    handed_out["late"] = request(broker, runner, "late", size=10)
+    assert handed_out["late"]
+
+    # Every worker keeps asking until the store runs dry
+    while True:
+        slices = {worker_id: request(broker, runner, worker_id, size=7) for worker_id in handed_out}
+        if not any(slices.values()):
+            break
+        for worker_id, indices in slices.items():
+            handed_out[worker_id] = handed_out[worker_id] + indices
+
+    everything = [index for indices in handed_out.values() for index in indices]
+    assert len(everything) == len(set(everything))
+    assert sorted(everything) == list(range(100))
+
+
+def test_late_worker_gets_nothing_a_stripe_fallback_already_took():
+    runner = FakeMaster("a", "b")
+    broker = CredentialBroker(40)
+    broker.assign_stripes(runner)
+    pool = CredentialPool([(f"agent{index}@test", "secret") for index in range(40)])
+    pool.runner = runner
+    pool.stripe = runner.messages(CREDENTIALS_STRIPE, "a")[-1]["indices"]
+
+    # Worker "a" gave up on the master and took its whole stripe; the master hears about it later
+    pool.add_stripe()
+    request(broker, runner, "a", whole_stripe=True)
+    runner.connect("late")
+    late = request(broker, runner, "late", size=40)
+
+    assert late
+    assert not set(late) & pool.assigned
+
+
+def test_stripes_stay_put_without_new_workers():
+    runner = FakeMaster("a", "b")
+    broker = CredentialBroker(10)
+    broker.assign_stripes(runner)
+    broker.assign_stripes(runner)
+    assert len(runner.messages(CREDENTIALS_STRIPE, "a")) == 1
@@ -1,139 +1,57 @@
-import pandas as pd
 from locust import HttpUser, task, between
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException
 import urllib3
 import time
 import logging
-import random
+from html.parser import HTMLParser
+from urllib.parse import urljoin
 
 from configuration import configuration_system
+from arrival import arrival_wait, scheduled_start
+import monitor  # noqa: F401 - samples this load generator while the test runs
+import samples  # noqa: F401 - records every request when record_samples is on
+from credentials import AccountHolder
+from contexts import ContextUser
+from sessions import BrowserSession
 
 # Suppress SSL warnings if needed
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-class BeelinksUser(HttpUser):
-    wait_time = between(5, 10)
-
-    used_users = set()  # Static variable to store used users
-
-    @staticmethod
-    def load_users_from_excel(file_path):
-        try:
-            df = pd.read_excel(file_path)
-            users = df.to_dict('records')  # Convert each row to a dictionary
-            return users
-        except Exception as e:
-            logging.error(f"Error loading users from Excel: {e}")
-            return []
-
-    def get_unique_user(self):
-        # Load users from Excel and filter out used ones
-        users = self.load_users_from_excel(configuration_system.excel_file)
-        available_users = [user for user in users if user['email'] not in self.used_users]
-
-        if not available_users:
-            self.logger.error("No more unique users available.")
-            raise ValueError("All users have been used.")
-
-        # Select a random user from the available ones
-        selected_user = random.choice(available_users)
-        self.used_users.add(selected_user['email'])  # Mark the user as used
-        return selected_user
+class BeelinksUser(BrowserSession, HttpUser):
+    abstract = configuration_system.browser_contexts
+    uses_browser_pool = True
+    role = "agent"  # Used by load_shape.py to bring agents online before visitors
+    wait_time = arrival_wait(between(5, 10))
+    recording = "ticket"
 
     def on_start(self):
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-        # Select browser and headless option
-        browser = "chrome"  # Assuming you're using Chrome here, adjust as necessary
-        headless = True  # Replace with configuration system's headless selection logic
-
-        try:
-            if browser == "chrome":
-                options = ChromeOptions()
-                service = ChromeService(executable_path=configuration_system.driver_location)
-            else:
-                raise ValueError(f"Unsupported browser: {browser}")
-
-            options.add_argument("--disable-gpu")
-            options.add_argument("--window-size=1200,1200")
-            options.add_argument("--ignore-certificate-errors")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-web-security")
-            if headless:
-                options.add_argument("--headless")
-
-            # Initialize WebDriver using the standalone ChromeDriver
-            self.driver = webdriver.Chrome(service=service, options=options)
-            self.logger.info(f"{browser.capitalize()} browser started successfully.")
-
-        except (WebDriverException, ValueError) as e:
-            self.logger.error(f"Error setting up the browser: {e}")
-            raise
-
-        # Get a unique user for this session
-        self.user = self.get_unique_user()
-
-        try:
-            # Open the login page
-            self.driver.get(configuration_system.loadtestURL)
-            self.logger.info(f"Opened URL: {self.driver.current_url}")
-
-            # Wait for the body to load to ensure the page is fully loaded
-            WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            # Wait for the email input field and enter email
-            self.logger.info("Waiting for email field...")
-            email_field = WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.ID, "email"))
-            )
-            email_field.send_keys(self.user["email"])
-
-            # Wait for the password field and enter password
-            self.logger.info("Waiting for password field...")
-            password_field = WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.ID, "password"))
-            )
-            password_field.send_keys(self.user["password"])
-
-            # Wait for the login button and click it
-            self.logger.info("Waiting for login button...")
-            login_button = WebDriverWait(self.driver, 120).until(
-                EC.element_to_be_clickable((By.ID, "login-submit"))
-            )
-            login_button.click()
-
-        except TimeoutException as e:
-            self.logger.error(f"TimeoutException during login: {e}")
-            self.driver.quit()
-            raise
-        except Exception as e:
-            self.logger.error(f"An error occurred during login: {e}")
-            self.driver.quit()
-            raise
+        self.start_browser()
+        self.start_session()
 
     @task
     def login_test(self):
-        start_time = time.time()
+        start_time = scheduled_start(self)
+        self.recorder.start_page("iteration")
         try:
             # Wait for the tickets link and click it
             self.logger.info("agent chat activated...")
-            WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.XPATH, '//li[@id="nav-tickets"]/a'))
-            ).click()
+            tickets_link = self.ready.clickable("tickets link", By.XPATH, '//li[@id="nav-tickets"]/a', 120)
+            navigation_start = self.timing.mark()
+            tickets_link.click()
 
-            # Measure response time
-            time.sleep(5)
+            # Let the tickets view finish its requests instead of sleeping, then reload it
+            self.ready.settled()
+            self.timing.collect("Tickets view", since=navigation_start)
             self.driver.refresh()
+            self.ready.page_loaded()
+            self.timing.collect("Tickets page")
+
+            # Measure response time
             response_time = (time.time() - start_time) * 1000
 
             self.environment.events.request.fire(
@@ -163,3 +81,168 @@ class BeelinksUser(HttpUser):
                 response_length=0,
                 exception=str(e)
             )
+
+        self.resources.report(self.recorder.capture())
+
+
+class BeelinksContextUser(AccountHolder, ContextUser):
+    """Agent running in an isolated context of the worker's shared browser."""
+
+    abstract = not configuration_system.browser_contexts
+    role = "agent"
+    wait_time = arrival_wait(between(5, 10))
+
+    def on_start(self):
+        super().on_start()
+        self.user = self.get_unique_user()
+        self.browser.run(self.login(self.user))
+
+    def on_stop(self):
+        super().on_stop()
+        self.release_user()
+
+    async def open_tickets(self):
+        page = self.page
+        await page.locator('//li[@id="nav-tickets"]/a').click(timeout=120000)
+        await page.wait_for_load_state("networkidle")
+        await page.reload()
+
+    @task
+    def login_test(self):
+        self.logger.info("agent chat activated...")
+        self.run_step("Login and Navigate to Tickets", self.open_tickets())
+        self.resources.report()
+
+
+class LoginPageParser(HTMLParser):
+    """Collects the login form, CSRF token and tickets link from a Beelinks page."""
+
+    CSRF_FIELDS = ("_token", "csrf_token", "csrfmiddlewaretoken", "authenticity_token", "_csrf")
+
+    def __init__(self):
+        super().__init__()
+        self.form_action = None
+        self.form_fields = {}
+        self.csrf_token = None
+        self.tickets_href = None
+        self._current_action = None
+        self._current_fields = {}
+        self._is_login_form = False
+        self._in_nav_tickets = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._current_action = attrs.get("action") or ""
+            self._current_fields = {}
+            self._is_login_form = False
+        elif tag == "input":
+            name = attrs.get("name")
+            if attrs.get("id") in ("email", "password"):
+                self._is_login_form = True
+            if name and attrs.get("type") == "hidden":
+                self._current_fields[name] = attrs.get("value") or ""
+                if name in self.CSRF_FIELDS:
+                    self.csrf_token = attrs.get("value")
+        elif tag == "meta" and attrs.get("name") in ("csrf-token", "csrf_token", "_csrf"):
+            self.csrf_token = attrs.get("content")
+        elif tag == "li" and attrs.get("id") == "nav-tickets":
+            self._in_nav_tickets = True
+        elif tag == "a" and self._in_nav_tickets and self.tickets_href is None:
+            self.tickets_href = attrs.get("href")
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            if self._is_login_form and self.form_action is None:
+                self.form_action = self._current_action
+                self.form_fields = dict(self._current_fields)
+            self._current_action = None
+        elif tag == "li":
+            self._in_nav_tickets = False
+
+    @classmethod
+    def parse(cls, html):
+        parser = cls()
+        parser.feed(html or "")
+        parser.close()
+        return parser
+
+
+class BeelinksApiUser(AccountHolder, HttpUser):
+    """Agent that logs in and loads tickets over plain HTTP, without a browser."""
+
+    abstract = True  # Opt in through api.py, so ticket.py runs only browser agents
+    host = configuration_system.loadtestURL
+    role = "agent"
+    wait_time = arrival_wait(between(5, 10))
+
+    def on_start(self):
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.csrf_token = None
+        self.tickets_url = configuration_system.tickets_path
+
+        # Get a unique user for this session
+        self.user = self.get_unique_user()
+        self.login()
+
+    def login(self):
+        """Fetches the login form and posts the agent's credentials."""
+        with self.client.get("/", name="API Login page", catch_response=True) as response:
+            if response.status_code >= 400:
+                response.failure(f"Login page returned {response.status_code}")
+                raise ValueError(f"Could not load the login page: {response.status_code}")
+            page = LoginPageParser.parse(response.text)
+            login_url = urljoin(response.url, page.form_action or configuration_system.login_path)
+
+        self.csrf_token = page.csrf_token
+        form = dict(page.form_fields)
+        form["email"] = self.user["email"]
+        form["password"] = self.user["password"]
+
+        with self.client.post(login_url, data=form, headers=self.xhr_headers(ajax=False),
+                              name="API Login submit", catch_response=True) as response:
+            landing = LoginPageParser.parse(response.text)
+            if response.status_code >= 400:
+                response.failure(f"Login returned {response.status_code}")
+            elif landing.form_action is not None:
+                response.failure(f"Login rejected for {self.user['email']}")
+            else:
+                self.csrf_token = landing.csrf_token or self.csrf_token
+                if landing.tickets_href:
+                    self.tickets_url = urljoin(response.url, landing.tickets_href)
+                self.logger.info(f"Logged in over HTTP as {self.user['email']}.")
+                return
+        raise ValueError(f"HTTP login failed for {self.user['email']}")
+
+    def on_stop(self):
+        self.release_user()
+
+    def xhr_headers(self, ajax=True):
+        """Builds the headers the Beelinks front-end sends with its requests."""
+        headers = {}
+        if ajax:
+            headers["X-Requested-With"] = "XMLHttpRequest"
+            headers["Accept"] = "application/json, text/plain, */*"
+        if self.csrf_token:
+            headers["X-CSRF-TOKEN"] = self.csrf_token
+        return headers
+
+    @task
+    def load_tickets(self):
+        """Loads the tickets view and the XHR calls it makes on page load."""
+        with self.client.get(self.tickets_url, name="API Tickets view", catch_response=True) as response:
+            if response.status_code >= 400:
+                response.failure(f"Tickets view returned {response.status_code}")
+                return
+            page = LoginPageParser.parse(response.text)
+            if page.form_action is not None:
+                response.failure("Session expired, redirected to login")
+                self.login()
+                return
+            self.csrf_token = page.csrf_token or self.csrf_token
+
+        for path in configuration_system.tickets_api_paths:
+            self.client.get(path, headers=self.xhr_headers(), name=f"API Tickets XHR {path}")
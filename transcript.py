@@ -0,0 +1,95 @@
+import uuid
+
+from locust import events
+
+from configuration import configuration_system
+
+# Installs a MutationObserver in the chat frame that timestamps the moment a tagged message
+# shows up in a transcript entry matching ackSelector. Only entries the server confirmed may
+# match: the widget's optimistic local echo of the message would otherwise count as delivered.
+# The send time is taken from the Enter keydown inside the page, so neither end of the
+# measurement includes WebDriver round-trips.
+WATCH_MESSAGE_JS = """
+function (tag, ackSelector) {
+    const state = window.__beelinksTranscript = window.__beelinksTranscript || {};
+    const entry = state[tag] = {armed: performance.now(), sent: null, seen: null, resolve: null};
+    const input = document.getElementById('chatMessage');
+    if (input) {
+        input.addEventListener('keydown', function onKey(event) {
+            if (event.key === 'Enter') {
+                entry.sent = performance.now();
+                input.removeEventListener('keydown', onKey);
+            }
+        });
+    }
+    const delivered = function () {
+        for (const node of document.querySelectorAll(ackSelector)) {
+            if (node.textContent.includes(tag)) {
+                return true;
+            }
+        }
+        return false;
+    };
+    entry.observer = new MutationObserver(function () {
+        if (entry.seen === null && delivered()) {
+            entry.seen = performance.now();
+            entry.observer.disconnect();
+            if (entry.resolve) {
+                entry.resolve();
+            }
+        }
+    });
+    entry.observer.observe(document.body, {
+        childList: true, subtree: true, characterData: true, attributes: true
+    });
+}
+"""
+
+# Resolves with the round-trip in milliseconds once the observer has seen the message,
+# or with null when it does not show up within the timeout.
+WAIT_MESSAGE_JS = """
+function (tag, timeoutMs) {
+    const state = window.__beelinksTranscript || {};
+    const entry = state[tag];
+    if (!entry) {
+        return Promise.resolve(null);
+    }
+    return new Promise(function (resolve) {
+        let finished = false;
+        const finish = function () {
+            if (finished) {
+                return;
+            }
+            finished = true;
+            entry.observer.disconnect();
+            delete state[tag];
+            resolve(entry.seen === null ? null : entry.seen - (entry.sent === null ? entry.armed : entry.sent));
+        };
+        if (entry.seen !== null) {
+            finish();
+            return;
+        }
+        entry.resolve = finish;
+        setTimeout(finish, timeoutMs);
+    });
+}
+"""
+
+
+def new_message_tag():
+    """Returns a short unique marker to embed in a chat message."""
+    return f"lt-{uuid.uuid4().hex[:12]}"
+
+
+def ack_selector():
+    """Returns chat_ack_selector, which has to be set: matching the whole page counts the local echo."""
+    if not configuration_system.chat_ack_selector:
+        raise ValueError("Set chat_ack_selector to the transcript entries the chat server has confirmed.")
+    return configuration_system.chat_ack_selector
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    # Checked once up front: without it every message of a browser visitor fails, which trips the load shape
+    if any(getattr(user_class, "sends_chat_messages", False) for user_class in environment.user_classes):
+        ack_selector()